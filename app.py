@@ -1,16 +1,23 @@
 
 import os, re, random
+import hashlib
+import threading
+import time
 from datetime import datetime
 from datetime import timedelta
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify
 from openai import OpenAI
 import json
 import math
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 
 SANITY_GATE_ENABLED = os.environ.get("SANITY_GATE_ENABLED", "1") != "0"
 SANITY_GATE_MODEL = os.environ.get("SANITY_GATE_MODEL", "gpt-4o-mini")
 REVIEW_MODEL = os.environ.get("REVIEW_MODEL", "gpt-5")
 REVIEW_TEMPERATURE = float(os.environ.get("REVIEW_TEMPERATURE", "0"))
+REVIEW_MAX_WORKERS = int(os.environ.get("REVIEW_MAX_WORKERS", "8"))
+REVIEW_CALL_TIMEOUT = float(os.environ.get("REVIEW_CALL_TIMEOUT", "30"))
+REVIEW_DEADLINE = float(os.environ.get("REVIEW_DEADLINE", "45"))
 
 
 _openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
@@ -18,6 +25,7 @@ _openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 # Use your original package structure (no broad fallbacks)
 from models.db_utils import (
     setup_database,
+    bind_unit_of_work,
     get_all_populations,
     save_population,
     get_or_create_user_session,
@@ -25,6 +33,16 @@ from models.db_utils import (
     save_news_analysis,
     get_news_analysis,
     get_run_content,
+    get_run_reviews,
+    save_run_reviews,
+    get_cached_news,
+    save_cached_news,
+)
+from models.llm_cache import cached_chat_completion
+from models.jobs import JobRunner, StageRejected, get_current_run_job
+from models.news_index import (
+    NEWS_LANGUAGE, NEWS_COUNTRY, NEWS_OFFLINE,
+    gnews_articles, add_articles, search_news, ingest_once,
 )
 
 def _(s): return s  # i18n shim
@@ -32,60 +50,146 @@ def _(s): return s  # i18n shim
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET", "dev-secret")
 
-# Initialize DB once
-setup_database()
+# Schema migrations run out of band (release phase: python -m models.migrations).
+# DB_AUTO_MIGRATE=1 applies them at startup instead, e.g. for local development.
+if os.environ.get("DB_AUTO_MIGRATE", "0") == "1":
+    setup_database()
+# One DB transaction per request instead of one per db_utils call
+bind_unit_of_work(app)
 
 # ---------------- Real Participants (DT files) ----------------
 REAL_USERS_DIR = os.environ.get("REAL_USERS_DIR", "./DT")
 
+QUALITY_GATE_BATCH_SIZE = int(os.environ.get("QUALITY_GATE_BATCH_SIZE", "40"))
+
+_QUALITY_GATE_RULES = (
+    "You are a strict quality gate for user-submitted media messages.\n"
+    "Classify the user's message as 'good' (meaningful, non-placeholder) or 'bad' "
+    "(very low effort). Consider 'bad' if it matches any of: placeholders (e.g., "
+    "lorem ipsum, test, hello world, TBD/TBA/coming soon), URL-only, keyboard mashing "
+    "(qwerty/asdf/12345), repeated filler (e.g., 'foo foo foo foo'), excessive emoji "
+    "with no content, or ALLCAPS shouting with punctuation spam.\n"
+)
+_QUALITY_GATE_EXAMPLES = [
+    {
+        "role": "system",
+        "content": (
+            "Bad examples:\n"
+            "- lorem ipsum dolor sit amet\n"
+            "- test\n"
+            "- hello world\n"
+            "- https://example.com\n"
+            "- foo foo foo foo\n"
+            "- 😂😂😂😂😂\n"
+            "- HELLO!!!!!!\n"
+            "- TBD / TBA / coming soon\n"
+            "- qwerty / asdf / 12345"
+        ),
+    },
+    {
+        "role": "system",
+        "content": (
+            "Good examples:\n"
+            "- Launches on 15 Oct: we cut onboarding time by 32% for SMBs. Join the waitlist.\n"
+            "- Tänään julkistus: uusi tuote vähentää energiankulutusta 12 % teollisuuden linjoissa.\n"
+            "- Muistutus: blogiartikkeli julkaistaan huomenna klo 10, linkki liitteenä."
+        ),
+    },
+]
+
+# --- Local pre-filter: obvious cases never hit the network ---
+_URL_ONLY_RE = re.compile(r"^(?:\s*(?:https?://|www\.)\S+\s*)+$", re.IGNORECASE)
+_PUNCT_SPAM_RE = re.compile(r"[!?]{4,}")
+_KEYBOARD_RUNS = ("qwert", "werty", "asdf", "sdfg", "zxcv", "hjkl", "jklö", "12345", "23456", "09876")
+_PLACEHOLDERS = {
+    "test", "testi", "testing", "testaus", "hello", "hello world", "hei maailma", "moi",
+    "tbd", "tba", "coming soon", "todo", "placeholder", "xxx", "asd", "foo", "bar", "foo bar",
+}
+_VOWELS = set("aeiouyåäö")
+
+def local_quality_gate(text: str) -> str | None:
+    """
+    Nopea paikallinen esiluokitin.
+    Returns 'bad' for obvious junk, 'good' for clearly substantive text,
+    or None when the case is ambiguous and should go to SANITY_GATE_MODEL.
+    """
+    t = (text or "").strip()
+    if not t:
+        return "bad"
+    if _URL_ONLY_RE.match(t):
+        return "bad"
+
+    low = t.lower()
+    if "lorem ipsum" in low:
+        return "bad"
+    norm = " ".join(re.findall(r"\w+", low))
+    if norm in _PLACEHOLDERS or all(p in _PLACEHOLDERS for p in re.split(r"\s*/\s*", low.strip(" .!"))):
+        return "bad"
+
+    words = re.findall(r"[^\W\d_]+", t)
+    letters = [ch for ch in t if ch.isalpha()]
+    if not letters:
+        return "bad"  # emoji / punctuation / digits only
+
+    # Emoji or symbol spam: more symbols than letters
+    symbols = sum(1 for ch in t if not ch.isalnum() and not ch.isspace() and ch not in ".,:;-–'\"()%€/")
+    if symbols > len(letters):
+        return "bad"
+
+    lowered = [w.lower() for w in words]
+    uniq = set(lowered)
+    # Repeated filler: 'foo foo foo foo'
+    if len(words) >= 4 and len(uniq) <= max(1, len(words) // 4):
+        return "bad"
+
+    # ALLCAPS shouting, usually with punctuation spam
+    upper_ratio = sum(1 for ch in letters if ch.isupper()) / len(letters)
+    if len(letters) >= 4 and upper_ratio > 0.9 and (_PUNCT_SPAM_RE.search(t) or len(letters) >= 40):
+        return "bad"
+    if _PUNCT_SPAM_RE.search(t) and len(words) <= 3:
+        return "bad"
+
+    # Keyboard mashing: keyboard runs or vowel-less "words" dominate a short text
+    if len(words) <= 4:
+        mashed = [w for w in lowered
+                  if any(run in w for run in _KEYBOARD_RUNS) or (len(w) >= 5 and not (set(w) & _VOWELS))]
+        if mashed and len(mashed) * 2 >= len(words):
+            return "bad"
+    # Only keyboard runs and digits ('asdf 12345'); phone numbers or prices next to real words pass
+    rest = re.sub(r"[\d\W_]+", "", low)
+    for run in _KEYBOARD_RUNS:
+        rest = rest.replace(run, "")
+    if not rest and any(run in re.sub(r"\W+", "", low) for run in _KEYBOARD_RUNS):
+        return "bad"
+
+    # Clearly substantive: enough words and enough variety
+    if len(words) >= 8 and len(uniq) / len(words) >= 0.5:
+        return "good"
+    return None
+
 def gpt_quality_gate(text: str) -> str:
     """
     Palauttaa 'good' tai 'bad'.
     'bad' = hyvin vähäpanoksinen: placeholder, testiviesti, URL-only, näppäinhakkaus,
            toistoa ilman sisältöä, pelkkää emoji- tai huutomerkki-spämmiä, ALLCAPS-huuto.
+    Obvious cases are decided locally; only ambiguous texts reach SANITY_GATE_MODEL.
     """
+    verdict = local_quality_gate(text)
+    if verdict:
+        return verdict
     try:
         messages = [
             {
                 "role": "system",
-                "content": (
-                    "You are a strict quality gate for user-submitted media messages.\n"
-                    "Classify the user's message as 'good' (meaningful, non-placeholder) or 'bad' "
-                    "(very low effort). Consider 'bad' if it matches any of: placeholders (e.g., "
-                    "lorem ipsum, test, hello world, TBD/TBA/coming soon), URL-only, keyboard mashing "
-                    "(qwerty/asdf/12345), repeated filler (e.g., 'foo foo foo foo'), excessive emoji "
-                    "with no content, or ALLCAPS shouting with punctuation spam.\n"
-                    "Return EXACTLY one word: good or bad. No punctuation. No explanations."
-                ),
-            },
-            {
-                "role": "system",
-                "content": (
-                    "Bad examples:\n"
-                    "- lorem ipsum dolor sit amet\n"
-                    "- test\n"
-                    "- hello world\n"
-                    "- https://example.com\n"
-                    "- foo foo foo foo\n"
-                    "- 😂😂😂😂😂\n"
-                    "- HELLO!!!!!!\n"
-                    "- TBD / TBA / coming soon\n"
-                    "- qwerty / asdf / 12345"
-                ),
-            },
-            {
-                "role": "system",
-                "content": (
-                    "Good examples:\n"
-                    "- Launches on 15 Oct: we cut onboarding time by 32% for SMBs. Join the waitlist.\n"
-                    "- Tänään julkistus: uusi tuote vähentää energiankulutusta 12 % teollisuuden linjoissa.\n"
-                    "- Muistutus: blogiartikkeli julkaistaan huomenna klo 10, linkki liitteenä."
-                ),
+                "content": _QUALITY_GATE_RULES
+                + "Return EXACTLY one word: good or bad. No punctuation. No explanations.",
             },
+            *_QUALITY_GATE_EXAMPLES,
             {"role": "user", "content": (text or "").strip()},
         ]
 
-        resp = _openai_client.chat.completions.create(
+        resp = cached_chat_completion(
+            _openai_client,
             model=SANITY_GATE_MODEL,
             messages=messages,
             temperature=0,
@@ -97,6 +201,50 @@ def gpt_quality_gate(text: str) -> str:
         # Häiriössä älä estä käyttöä
         return "good"
 
+def _gpt_quality_gate_chunk(texts: list[str]) -> list[str]:
+    """Classify several texts with one request. Falls back to 'good' on any failure."""
+    try:
+        messages = [
+            {
+                "role": "system",
+                "content": _QUALITY_GATE_RULES
+                + "The user sends a JSON array of messages. Classify each one independently.\n"
+                "Return ONLY a JSON array of the same length containing \"good\" or \"bad\" "
+                "in the same order. No explanations.",
+            },
+            *_QUALITY_GATE_EXAMPLES,
+            {"role": "user", "content": json.dumps([(t or "").strip() for t in texts], ensure_ascii=False)},
+        ]
+        resp = cached_chat_completion(
+            _openai_client,
+            model=SANITY_GATE_MODEL,
+            messages=messages,
+            temperature=0,
+            max_tokens=8 * len(texts) + 16,
+        )
+        txt = (resp.choices[0].message.content or "").strip()
+        i, j = txt.find("["), txt.rfind("]")
+        labels = json.loads(txt[i:j+1]) if i != -1 and j != -1 else []
+        if len(labels) != len(texts):
+            raise ValueError("label count mismatch")
+        return ["bad" if str(l).strip().lower().startswith("bad") else "good" for l in labels]
+    except Exception:
+        return ["good"] * len(texts)
+
+def gpt_quality_gate_batch(texts: list[str]) -> list[str]:
+    """
+    Batch version of gpt_quality_gate for bulk imports.
+    Returns labels in input order; ambiguous texts are sent in chunks of
+    QUALITY_GATE_BATCH_SIZE, one request per chunk.
+    """
+    labels = [local_quality_gate(t) for t in texts]
+    pending = [i for i, l in enumerate(labels) if l is None]
+    for k in range(0, len(pending), QUALITY_GATE_BATCH_SIZE):
+        idx = pending[k:k + QUALITY_GATE_BATCH_SIZE]
+        for i, label in zip(idx, _gpt_quality_gate_chunk([texts[i] for i in idx])):
+            labels[i] = label
+    return labels
+
 def score_with_llm(user_text: str, dt_body: str) -> dict:
     """
     Returns:
@@ -130,7 +278,8 @@ def score_with_llm(user_text: str, dt_body: str) -> dict:
     )
 
     try:
-        r = _openai_client.chat.completions.create(
+        r = cached_chat_completion(
+            _openai_client,
             model=REVIEW_MODEL,                # e.g. "gpt-5"
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -138,14 +287,18 @@ def score_with_llm(user_text: str, dt_body: str) -> dict:
             ],
             temperature=REVIEW_TEMPERATURE,   # keep 0 for consistency
             max_tokens=200,
+            timeout=REVIEW_CALL_TIMEOUT,
         )
         txt = (r.choices[0].message.content or "").strip()
         i, j = txt.find("{"), txt.rfind("}")
         data = json.loads(txt[i:j+1]) if i != -1 and j != -1 else {}
     except Exception:
-        data = {}
+        data = {"reason": "fallback: reviewer call failed"}
 
-    # Robust parsing & normalization
+    return _normalize_review(data)
+
+def _normalize_review(data: dict) -> dict:
+    """Robust parsing & normalization of a reviewer's raw JSON reply."""
     score = data.get("score")
     try:
         score = int(score)
@@ -174,6 +327,86 @@ def score_with_llm(user_text: str, dt_body: str) -> dict:
 
     return {"score": score, "decision": decision, "confidence": round(conf, 2), "reason": reason}
 
+def score_many_with_llm(user_text: str, dt_bodies: list[str],
+                        max_workers: int | None = None,
+                        deadline: float | None = None,
+                        on_result=None) -> list[dict]:
+    """
+    Run score_with_llm for every DT body in parallel on a bounded thread pool.
+    Results keep the order of dt_bodies. Reviews not finished within the global
+    deadline (seconds) get a neutral fallback instead of blocking the page.
+    on_result(index, review), if given, is called in the caller's thread as
+    soon as each review arrives.
+    """
+    if not dt_bodies:
+        return []
+    max_workers = max(1, min(max_workers or REVIEW_MAX_WORKERS, len(dt_bodies)))
+    deadline = REVIEW_DEADLINE if deadline is None else deadline
+
+    out = [None] * len(dt_bodies)
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dt-review")
+    try:
+        futures = {pool.submit(score_with_llm, user_text, body): i for i, body in enumerate(dt_bodies)}
+        try:
+            for fut in as_completed(futures, timeout=deadline):
+                i = futures[fut]
+                if fut.exception() is None:
+                    out[i] = fut.result()
+                else:
+                    out[i] = _normalize_review({"reason": "fallback: reviewer call failed"})
+                if on_result:
+                    on_result(i, out[i])
+        except FuturesTimeout:
+            pass
+        for i, review in enumerate(out):
+            if review is None:
+                out[i] = _normalize_review({"reason": "fallback: reviewer timed out"})
+                if on_result:
+                    on_result(i, out[i])
+        return out
+    finally:
+        # Don't wait for stragglers past the deadline; drop anything not yet started
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _dt_hash(body: str) -> str:
+    return hashlib.sha256((body or "").encode("utf-8")).hexdigest()
+
+def get_reviews_for_run(run_id: str, user_text: str, filenames: list[str], dts: list,
+                        on_progress=None) -> list[dict]:
+    """
+    Return one review per DT file, in order. Reviews already stored for this run
+    (same DT content hash and REVIEW_MODEL) are reused; only missing or stale ones
+    are scored and written back, each one as soon as it arrives.
+    on_progress(done, total), if given, is called after every stored review.
+    """
+    bodies = [(dt and dt["body"]) or "" for dt in dts]
+    hashes = [_dt_hash(b) for b in bodies]
+    stored = get_run_reviews(run_id, REVIEW_MODEL)
+
+    missing = [i for i, (fn, h) in enumerate(zip(filenames, hashes)) if (fn, h) not in stored]
+    total, done = len(filenames), len(filenames) - len(missing)
+    if on_progress:
+        on_progress(done, total)
+
+    def _store(k, review):
+        nonlocal done
+        i = missing[k]
+        stored[(filenames[i], hashes[i])] = review
+        # Fallbacks (timeouts, failed calls) are retried on the next load
+        if not review["reason"].startswith("fallback:"):
+            try:
+                save_run_reviews(run_id, REVIEW_MODEL, [(filenames[i], hashes[i], review)])
+            except Exception:
+                # non-fatal: a concurrent reload may have stored the same key first
+                pass
+        done += 1
+        if on_progress:
+            on_progress(done, total)
+
+    score_many_with_llm(user_text, [bodies[i] for i in missing], on_result=_store)
+
+    return [stored[(fn, h)] for fn, h in zip(filenames, hashes)]
+
 def _ensure_dir(path: str):
     if not os.path.isdir(path):
         os.makedirs(path, exist_ok=True)
@@ -210,32 +443,20 @@ def _slugify(name: str) -> str:
 
 def list_dt_files() -> list[dict]:
     """Return [{'filename', 'name', 'profile'} ...] for all DTs in REAL_USERS_DIR."""
-    _ensure_dir(REAL_USERS_DIR)
-    out = []
-    for fn in os.listdir(REAL_USERS_DIR):
-        if not fn.lower().endswith((".txt", ".md")):
-            continue
-        path = os.path.join(REAL_USERS_DIR, fn)
-        try:
-            raw = _read_text(path)
-            meta, body = _parse_front_matter(raw)
-            name = meta.get("name") or os.path.splitext(fn)[0]
-            profile = meta.get("profile", "")
-            out.append({"filename": fn, "name": name, "profile": profile, "path": path})
-        except Exception:
-            continue
+    out = [
+        {"filename": e["filename"], "name": e["name"], "profile": e["profile"], "path": e["path"]}
+        for e in _dt_catalog.entries()
+    ]
     # stable order: by name then filename
     out.sort(key=lambda x: (x["name"].lower(), x["filename"].lower()))
     return out
 
 def read_dt_file(filename: str) -> dict | None:
     """Return {'meta': {...}, 'body': '...', 'raw': '...', 'path': '...'} or None."""
-    path = os.path.join(REAL_USERS_DIR, filename)
-    if not os.path.isfile(path):
+    e = _dt_catalog.get(filename)
+    if not e:
         return None
-    raw = _read_text(path)
-    meta, body = _parse_front_matter(raw)
-    return {"meta": meta, "body": body, "raw": raw, "path": path}
+    return {"meta": e["meta"], "body": e["body"], "raw": e["raw"], "path": e["path"]}
 
 def create_dt_file(name: str, profile: str, body: str) -> str:
     """Create a new DT file with YAML front matter. Returns the filename."""
@@ -267,6 +488,97 @@ def _infer_name_from_body(body: str, default_name: str) -> str:
         return head.split(",")[0].strip() or default_name
     return default_name
 
+class DTCatalog:
+    """
+    In-memory index of the DT files in a directory.
+
+    Each file is read and parsed once; entries are revalidated with a single
+    os.scandir() stat pass (mtime_ns + size), so unchanged files are never
+    re-read. Full rescans are throttled to one per `min_interval` seconds;
+    single-file lookups only stat that one file.
+    """
+
+    def __init__(self, directory: str, min_interval: float = 1.0):
+        self.directory = directory
+        self.min_interval = min_interval
+        self._entries: dict[str, dict] = {}
+        self._last_scan = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, fn: str, path: str, sig: tuple) -> dict | None:
+        try:
+            raw = _read_text(path)
+        except Exception:
+            return None
+        meta, body = _parse_front_matter(raw)
+        stem = os.path.splitext(fn)[0]
+        return {
+            "filename": fn,
+            "path": path,
+            "sig": sig,
+            "meta": meta,
+            "body": body,
+            "raw": raw,
+            "name": meta.get("name") or stem,
+            "profile": meta.get("profile", ""),
+            "display_name": meta.get("name") or _infer_name_from_body(body, stem),
+        }
+
+    def refresh(self, force: bool = False):
+        """One stat pass over the directory; (re)parse only new or changed files."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_scan < self.min_interval:
+                return
+            _ensure_dir(self.directory)
+            seen = set()
+            with os.scandir(self.directory) as it:
+                for de in it:
+                    fn = de.name
+                    if not fn.lower().endswith((".txt", ".md")) or not de.is_file():
+                        continue
+                    st = de.stat()
+                    sig = (st.st_mtime_ns, st.st_size)
+                    seen.add(fn)
+                    cur = self._entries.get(fn)
+                    if cur and cur["sig"] == sig:
+                        continue
+                    entry = self._load(fn, de.path, sig)
+                    if entry:
+                        self._entries[fn] = entry
+                    else:
+                        self._entries.pop(fn, None)
+            for fn in set(self._entries) - seen:
+                del self._entries[fn]
+            self._last_scan = now
+
+    def entries(self) -> list[dict]:
+        self.refresh()
+        with self._lock:
+            return list(self._entries.values())
+
+    def get(self, filename: str) -> dict | None:
+        path = os.path.join(self.directory, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(filename, None)
+            return None
+        if not os.path.isfile(path):
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cur = self._entries.get(filename)
+            if cur and cur["sig"] == sig:
+                return cur
+            entry = self._load(filename, path, sig)
+            if entry:
+                self._entries[filename] = entry
+            return entry
+
+_dt_catalog = DTCatalog(REAL_USERS_DIR, float(os.environ.get("DT_CATALOG_INTERVAL", "1")))
+
 def prepare_gpt_contexts(run_text: str, selected_filenames: list[str]) -> list[dict]:
     """
     For each selected DT file, build a payload ready to send to GPT:
@@ -276,13 +588,13 @@ def prepare_gpt_contexts(run_text: str, selected_filenames: list[str]) -> list[d
     """
     contexts = []
     for fn in selected_filenames:
-        dt = read_dt_file(fn)  # returns {'meta':{}, 'body':..., 'raw':..., 'path':...}
+        dt = _dt_catalog.get(fn)  # cached entry: meta, body, raw, display_name, ...
         if not dt:
             continue
 
-        meta, body, raw = dt.get("meta", {}), dt.get("body", ""), dt.get("raw", "")
-        # Prefer explicit 'name' if you later add YAML front-matter; otherwise infer from body
-        display_name = meta.get("name") or _infer_name_from_body(body, os.path.splitext(fn)[0])
+        raw = dt["raw"]
+        # Prefer explicit 'name' from YAML front-matter; otherwise inferred from body (cached)
+        display_name = dt["display_name"]
 
         # If you want to add optional per-run “header” before the DT, do it here:
         # header = f"Context for this review: The following participant description remains authoritative.\n"
@@ -330,24 +642,125 @@ def fetch_news_articles(query: str, max_items: int = 6):
     """Optional dependency. No crash if gnews is missing."""
     try:
         from gnews import GNews
-        g = GNews(language="fi", country="FI", max_results=max_items)
-        results = g.get_news(query)
-        arts = []
-        for it in results or []:
-            arts.append({
-                "title": it.get("title"),
-                "publisher": (it.get("publisher") or {}).get("title",""),
-                "published": it.get("published date") or "",
-                "url": it.get("url"),
-            })
-        return arts
+        g = GNews(language=NEWS_LANGUAGE, country=NEWS_COUNTRY, max_results=max_items)
+        return gnews_articles(g.get_news(query))
     except Exception:
         return []
 
+NEWS_CACHE_TTL = float(os.environ.get("NEWS_CACHE_TTL", "900"))  # seconds
+
+class _SingleFlight:
+    """Collapse concurrent calls with the same key into one; followers get the leader's result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"event": threading.Event(), "result": None}
+        if not leader:
+            call["event"].wait()
+            return call["result"]
+        try:
+            call["result"] = fn()
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["event"].set()
+        return call["result"]
+
+_news_flight = _SingleFlight()
+
+def normalize_news_query(query: str) -> str:
+    """Lowercase, dedupe and sort the query words so equivalent topic sets share a cache key."""
+    return " ".join(sorted(set((query or "").lower().split())))
+
+def fetch_news_articles_cached(query: str, max_items: int = 6):
+    """
+    fetch_news_articles behind a shared TTL cache (news_cache table) with
+    in-process single-flight, so concurrent identical queries make one fetch.
+    """
+    q = normalize_news_query(query)
+    if not q:
+        return []
+
+    def load():
+        try:
+            cached = get_cached_news(q, NEWS_LANGUAGE, NEWS_COUNTRY, NEWS_CACHE_TTL, min_results=max_items)
+        except Exception:
+            cached = None
+        if cached is not None:
+            return cached
+        articles = fetch_news_articles(q, max_items)
+        if articles:  # empty = gnews missing or failed; try again next time
+            try:
+                save_cached_news(q, NEWS_LANGUAGE, NEWS_COUNTRY, max_items, articles)
+            except Exception:
+                # non-fatal: another worker may have stored the same key first
+                pass
+            _index_articles(articles, source="gnews")
+        return articles
+
+    articles = _news_flight.do((q, NEWS_LANGUAGE, NEWS_COUNTRY), load)
+    return list(articles[:max_items])
+
+# ---- Shared news index (models/news_index.py; filled by the Procfile worker) ----
+NEWS_INDEX_ENABLED = os.environ.get("NEWS_INDEX_ENABLED", "1") != "0"
+NEWS_INDEX_WINDOW_DAYS = float(os.environ.get("NEWS_INDEX_WINDOW_DAYS", "14"))
+NEWS_INDEX_MIN_RESULTS = int(os.environ.get("NEWS_INDEX_MIN_RESULTS", "3"))
+
+_news_backfill_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="news-backfill")
+
+# Offline there is no worker to rely on: run one ingest pass (the fixture feed) at startup.
+# claim_ingest keeps it to one load per NEWS_INGEST_INTERVAL across processes.
+if NEWS_OFFLINE and NEWS_INDEX_ENABLED:
+    try:
+        ingest_once()
+    except Exception:
+        app.logger.exception("News index: offline ingest failed")
+
+def _index_articles(articles, source=None):
+    if not NEWS_INDEX_ENABLED:
+        return 0
+    try:
+        return add_articles(articles, source=source)
+    except Exception:
+        app.logger.exception("News index: adding articles failed")
+        return 0
+
+def search_news_index(topics: list[str], limit: int = 6) -> list:
+    try:
+        return search_news(topics, days=NEWS_INDEX_WINDOW_DAYS, limit=limit)
+    except Exception:
+        app.logger.exception("News index: search failed")
+        return []
+
+def snapshot_articles(topics: list[str], query: str, limit: int = 6) -> list:
+    """
+    Index first. No hits: fetch live from GNews, which also feeds the index
+    (offline the index, filled by the ingest pass, is all there is). Thin
+    results: top up the index in the background.
+    """
+    articles = search_news_index(topics, limit)
+    if not articles:
+        if NEWS_OFFLINE:
+            return articles
+        return fetch_news_articles_cached(query, limit)
+    if len(articles) < NEWS_INDEX_MIN_RESULTS and not NEWS_OFFLINE:
+        _news_backfill_pool.submit(fetch_news_articles_cached, query, 10)
+    return articles
+
 def build_mediasaa_snapshot(text: str) -> dict:
     topics = extract_topics(text, 6)
     query = " ".join(topics[:3])
-    articles = fetch_news_articles(query, 6)
+    if NEWS_INDEX_ENABLED:
+        articles = snapshot_articles(topics, query, 6)
+    else:
+        articles = fetch_news_articles_cached(query, 6)
     negativity = any(k in text.lower() for k in ["irtisan", "hinta", "kriisi", "ongel", "vuoto", "riita", "koh"])
     positivity = any(k in text.lower() for k in ["paranee", "kasvu", "uusi", "lanse", "ennätys", "yhteistyö"])
     volume = len(articles) if articles else random.randint(40, 180)
@@ -504,6 +917,39 @@ def tips_for_population(text: str, pop_name: str, snapshot: dict):
         tips = ["Tiivistä ingressi kahteen virkkeeseen.", "Lisää selkeä CTA viimeiseen kappaleeseen."]
     return tips[:3]
 
+# ---------------- Background analysis jobs ----------------
+def _flash_low_quality():
+    flash(_("Heikkolaatuinen syöte havaittu. Järjestelmä oppii julkaisutyylistäsi. "
+            "Siksi viestisi ei edennyt arviointiin."))
+
+_job_runner = JobRunner()
+
+def _stage_gate(ctx, progress):
+    if SANITY_GATE_ENABLED and gpt_quality_gate(ctx["content"]) == "bad":
+        raise StageRejected("quality gate: bad")
+
+def _stage_snapshot(ctx, progress):
+    save_news_analysis(ctx["run_id"], build_mediasaa_snapshot(ctx["content"]))
+
+def _stage_reviews(ctx, progress):
+    filenames = ctx["selected_dt_files"]
+    dts = [read_dt_file(fn) for fn in filenames]
+    get_reviews_for_run(ctx["run_id"], ctx["content"], filenames, dts, on_progress=progress)
+
+ANALYSIS_STAGES = [
+    ("gate", _stage_gate),
+    ("snapshot", _stage_snapshot),
+    ("reviews", _stage_reviews),
+]
+
+def start_analysis_job(run_id: str, content: str, selected_dt_files: list[str]):
+    """Queue the gate → snapshot → reviews pipeline for a run; progress goes to run_jobs."""
+    return _job_runner.submit(run_id, ANALYSIS_STAGES, {
+        "run_id": run_id,
+        "content": content,
+        "selected_dt_files": list(selected_dt_files or []),
+    })
+
 # ---------------- Routes ----------------
 @app.get("/")
 def index():
@@ -527,11 +973,10 @@ def analyze():
     if not content:
         flash(_("Syötä sisältö ensin."))
         return redirect(url_for("index"))
-    # Roskafiltteri (GPT) – estä arviointi, jos viesti on "bad"
-    if SANITY_GATE_ENABLED and gpt_quality_gate(content) == "bad":
+    # Roskafiltteri – ilmiselvät tapaukset heti paikallisesti; epäselvät GPT:lle taustatyössä
+    if SANITY_GATE_ENABLED and local_quality_gate(content) == "bad":
         session["user_content"] = content  # pidä teksti kentässä korjauksia varten
-        flash(_("Heikkolaatuinen syöte havaittu. Järjestelmä oppii julkaisutyylistäsi. "
-                "Siksi viestisi ei edennyt arviointiin."))
+        _flash_low_quality()
         return redirect(url_for("index"))
 
     # Keep your original calling style (positional args) to avoid signature drift
@@ -542,32 +987,115 @@ def analyze():
     session["gpt_contexts_count"] = len(gpt_contexts)
 
     run_id = create_run(sid, None, content_text=content, title=title or None)
-    snapshot = build_mediasaa_snapshot(content)
-    save_news_analysis(run_id, snapshot)
-
-    target_audiences = []
-    if selected_dt_files:
-        # Use the DT “name” from file meta for display/scoring label
-        for fn in selected_dt_files:
-            dt = read_dt_file(fn)
-            display_name = (dt and (dt["meta"].get("name") or fn)) or fn
-            target_audiences.append(display_name)
-    else:
-        pops = _get_population_names() or [
-            "Toimittajat","Pk-yrityspäättäjät","Sijoittajat",
-            "Korkeakoulutetut 25–44","Kriittinen kansalaisyleisö","Koko Suomi 18–65"
-        ]
-        target_audiences = pops
-
-    results = []
-    for name in target_audiences:
-        s, d, c = estimate_resonance(content, name, snapshot)
-        results.append({"name": name, "score": s, "decision": d, "confidence": c})
-    results.sort(key=lambda r: r["score"])
+    # Gate, news snapshot and DT reviews run in the background; /results waits on the job
+    start_analysis_job(run_id, content, selected_dt_files)
 
     session["current_run_id"] = run_id
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"run_id": run_id, "status_url": url_for("run_status", run_id=run_id)}), 202
     return redirect(url_for("results"))
 
+SSE_POLL_INTERVAL = float(os.environ.get("SSE_POLL_INTERVAL", "0.5"))
+# One stream request stays well below gunicorn's --timeout (Procfile); the browser's
+# EventSource reconnects after SSE_RETRY_MS and the new request picks up from the DB.
+SSE_MAX_SECONDS = float(os.environ.get("SSE_MAX_SECONDS", "20"))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("SSE_KEEPALIVE_SECONDS", "10"))
+SSE_RETRY_MS = int(os.environ.get("SSE_RETRY_MS", "1000"))
+
+def _dt_label(fn: str) -> str:
+    dt = read_dt_file(fn)
+    return (dt and (dt["meta"].get("name") or fn)) or fn
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _snapshot_event(snapshot: dict, user_text: str) -> dict:
+    topics = snapshot.get("topics", [])
+    ranked = rank_articles(snapshot.get("articles", []) or [], topics)
+    return {
+        "topics": topics,
+        "articles": ranked[:3],
+        "has_more": len(ranked) > 3,
+        "topic_resonance": summarize_topic_resonance(topics, snapshot, user_text),
+    }
+
+@app.get("/runs/<run_id>/stream")
+def run_stream(run_id):
+    """
+    Server-sent events for a run: 'snapshot' once the news snapshot is stored,
+    one 'review' per DT reviewer as soon as it is stored, 'status' on job
+    progress and a final 'done'. State is read from the DB, so the stream works
+    whichever worker runs the job. Each request lasts at most SSE_MAX_SECONDS
+    (with keepalive comments meanwhile); if the job is still running then, the
+    stream just ends and EventSource reconnects, replaying what is stored.
+    """
+    # Resolve everything that needs the request context before streaming starts
+    selected_dt_files = session.get("selected_dt_files") or []
+    user_text = (get_run_content(run_id) or "").strip()
+    expected = []
+    for fn in selected_dt_files:
+        dt = read_dt_file(fn)
+        label = (dt and (dt["meta"].get("name") or fn)) or fn
+        expected.append((fn, _dt_hash((dt and dt["body"]) or ""), label,
+                         url_for("pop_suggestions", pop_name=label)))
+
+    def generate():
+        sent_snapshot, sent_reviews, last_status = False, set(), None
+        give_up = time.monotonic() + SSE_MAX_SECONDS
+        last_sent = time.monotonic()
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while True:
+            job = get_current_run_job(run_id)
+            if not sent_snapshot:
+                snapshot = get_news_analysis(run_id)
+                if snapshot:
+                    sent_snapshot = True
+                    yield _sse("snapshot", _snapshot_event(snapshot, user_text))
+            if len(sent_reviews) < len(expected):
+                stored = get_run_reviews(run_id, REVIEW_MODEL)
+                for fn, h, label, tips_url in expected:
+                    if fn not in sent_reviews and (fn, h) in stored:
+                        sent_reviews.add(fn)
+                        yield _sse("review", {"filename": fn, "name": label,
+                                              "suggestions_url": tips_url, **stored[(fn, h)]})
+            if job and job != last_status:
+                last_status = job
+                last_sent = time.monotonic()
+                yield _sse("status", job)
+            if not job or job["status"] not in ("queued", "running"):
+                yield _sse("done", {"status": job and job["status"],
+                                    "complete": sent_snapshot and len(sent_reviews) == len(expected)})
+                return
+            if time.monotonic() > give_up:
+                return  # client reconnects
+            if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            time.sleep(SSE_POLL_INTERVAL)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/runs/<run_id>/status")
+def run_status(run_id):
+    job = get_current_run_job(run_id)
+    if not job:
+        return jsonify({"error": "unknown run"}), 404
+    return jsonify(job)
+
+@app.post("/api/quality-gate")
+def quality_gate_api():
+    """Classify {"texts": [...]} (or {"text": "..."}) -> {"labels": ["good"|"bad", ...]}."""
+    data = request.get_json(silent=True) or {}
+    texts = data.get("texts")
+    if texts is None and "text" in data:
+        texts = [data.get("text")]
+    if not isinstance(texts, list):
+        return jsonify({"error": "expected JSON body with 'texts' list"}), 400
+    texts = [str(t or "") for t in texts]
+    labels = gpt_quality_gate_batch(texts) if SANITY_GATE_ENABLED else ["good"] * len(texts)
+    return jsonify({"labels": labels})
+
 @app.post("/participants/new")
 def create_participant():
     name = (request.form.get("p_name") or "").strip()
@@ -587,6 +1115,37 @@ def results():
     if not run_id:
         return redirect(url_for("index"))
 
+    # 0) Background job still running (or rejected by the quality gate / lost)?
+    job = get_current_run_job(run_id)
+    if job and job["status"] == "rejected":
+        session["user_content"] = get_run_content(run_id) or ""
+        _flash_low_quality()
+        return redirect(url_for("index"))
+    failed = bool(job and job["status"] == "failed")
+    if failed:
+        # Prefill the form for a resubmit; the page below shows only what was stored
+        session["user_content"] = get_run_content(run_id) or ""
+        flash(_("Analyysi keskeytyi, osa tuloksista voi puuttua. Aja analyysi uudelleen."))
+    if job and job["status"] in ("queued", "running"):
+        # Render the page shell now; /runs/<id>/stream fills it in as results arrive
+        return render_template(
+            "results.html",
+            _=_,
+            title="Sointu",
+            streaming=True,
+            stream_url=url_for("run_stream", run_id=run_id),
+            user_text=(get_run_content(run_id) or "").strip(),
+            topics=[],
+            articles=[],
+            has_more=False,
+            show_more=False,
+            topic_resonance="",
+            snapshot={},
+            results=[{"name": _dt_label(fn), "filename": fn, "pending": True} for fn in selected_dt_files],
+            selected_dt_files=selected_dt_files,
+            gpt_contexts_count=session.get("gpt_contexts_count", 0),
+        )
+
     # 1) Load data from DB, not from session
     snapshot = get_news_analysis(run_id) or {}
     user_text = (get_run_content(run_id) or "").strip()
@@ -625,10 +1184,18 @@ def results():
 
     results = []
     if selected_dt_files:
-        for fn in selected_dt_files:
-            dt = read_dt_file(fn)
+        dts = [read_dt_file(fn) for fn in selected_dt_files]
+        if failed:
+            # No model calls on the request thread: stored reviews only, the rest shown as missing
+            stored = get_run_reviews(run_id, REVIEW_MODEL)
+            reviews = [stored.get((fn, _dt_hash((dt and dt["body"]) or ""))) for fn, dt in zip(selected_dt_files, dts)]
+        else:
+            reviews = get_reviews_for_run(run_id, user_text, selected_dt_files, dts)
+        for fn, dt, review in zip(selected_dt_files, dts, reviews):
             display_name = (dt and (dt["meta"].get("name") or fn)) or fn
-            review = score_with_llm(user_text, (dt and dt["body"]) or "")
+            if review is None:
+                results.append({"name": display_name, "filename": fn, "missing": True, "score": None})
+                continue
             results.append({
                 "name": display_name,
                 "score": review["score"],
@@ -643,7 +1210,7 @@ def results():
             s, d, c = estimate_resonance(user_text, name, snapshot)
             results.append({"name": name, "score": s, "decision": d, "confidence": c})
 
-    results.sort(key=lambda r: r["score"])
+    results.sort(key=lambda r: (r["score"] is None, r["score"] or 0))
 
     return render_template(
         "results.html",
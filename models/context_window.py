@@ -0,0 +1,191 @@
+#context_window.py
+"""
+Token-budgeted context windows for discussions and chat history.
+
+History is split into
+  - a rolling summary of older turns, folded in fixed-size blocks so the same
+    prefix always produces the same chain of summary calls (cached by llm_cache
+    at temperature 0, and for runs stored in chat_summaries), and
+  - the newest turns verbatim, as many as fit what the summary leaves of the
+    token budget.
+
+Tokens are counted locally with tiktoken when it is installed, otherwise with a
+~4 bytes per token estimate.
+"""
+import os
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+from .llm_cache import cached_chat_completion
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_SUMMARY_BLOCK = int(os.environ.get("CONTEXT_SUMMARY_BLOCK", "8"))      # turns folded per summary call
+CONTEXT_SUMMARY_TOKENS = int(os.environ.get("CONTEXT_SUMMARY_TOKENS", "300"))
+CONTEXT_SUMMARY_MODEL = os.environ.get("CONTEXT_SUMMARY_MODEL", "gpt-4o-mini")
+MESSAGE_OVERHEAD_TOKENS = 4  # role / separators per chat message
+
+SUMMARY_INSTRUCTIONS = (
+    "You keep the minutes of a discussion. Merge the new messages into the running summary. "
+    "Keep who said what (by name), points of agreement and disagreement and open questions. "
+    "Reply with the updated summary only, at most 200 words."
+)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str | None):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def turn_text(turn) -> str:
+    """A turn is a plain string or a dict with name/author and text."""
+    if isinstance(turn, str):
+        return turn
+    name = turn.get("name") or turn.get("author") or ""
+    return f"{name}: {turn.get('text', '')}" if name else turn.get("text", "")
+
+
+def turn_tokens(turn, model: str | None = None) -> int:
+    return count_tokens(turn_text(turn), model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def split_by_budget(turns, budget: int, model: str | None = None, block: int = CONTEXT_SUMMARY_BLOCK):
+    """
+    Return the index where the verbatim tail starts. The tail is the longest run
+    of newest turns that fits `budget`; the boundary is rounded up to a multiple
+    of `block` so summaries are folded in stable blocks (the tail then carries
+    up to block-1 turns fewer, never more than the budget).
+    """
+    used, start = 0, len(turns)
+    while start > 0:
+        cost = turn_tokens(turns[start - 1], model)
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    if start and block > 1:
+        start = min(len(turns), start + (-start % block))
+    return start
+
+
+def fold_summary(client, summary: str, turns, model: str = CONTEXT_SUMMARY_MODEL) -> str:
+    """Merge turns into summary with one deterministic (cacheable) call."""
+    if not turns:
+        return summary
+    content = (
+        f"Running summary:\n{summary or '(empty)'}\n\n"
+        "New messages:\n" + "\n".join(turn_text(t) for t in turns)
+    )
+    resp = cached_chat_completion(
+        client,
+        model=model,
+        messages=[
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": content},
+        ],
+        temperature=0,
+        max_tokens=CONTEXT_SUMMARY_TOKENS,
+        timeout=60,
+    )
+    return (resp.choices[0].message.content or "").strip() or summary
+
+
+def fold_blocks(client, summary: str, turns, block: int = CONTEXT_SUMMARY_BLOCK, on_block=None):
+    """Fold turns into summary `block` turns at a time; on_block(end_index, summary) after each."""
+    for i in range(0, len(turns), block):
+        summary = fold_summary(client, summary, turns[i:i + block])
+        if on_block:
+            on_block(i + len(turns[i:i + block]), summary)
+    return summary
+
+
+def _window(client, summary: str, turns, budget: int, model: str | None = None, on_block=None):
+    """
+    Fold the oldest of `turns` into `summary` until summary + the rest fit budget.
+    The summary's maximum size is reserved before the verbatim tail is chosen,
+    and the tail is trimmed again to what the actual summary leaves.
+    Returns (summary, folded, start): turns[:folded] are in the summary and
+    turns[start:] are the verbatim tail (start >= folded).
+    """
+    summary_cost = count_tokens(summary, model) + MESSAGE_OVERHEAD_TOKENS if summary else 0
+    if summary_cost <= budget and split_by_budget(turns, budget - summary_cost, model, block=1) == 0:
+        return summary, 0, 0
+    reserve = CONTEXT_SUMMARY_TOKENS + MESSAGE_OVERHEAD_TOKENS
+    end = split_by_budget(turns, max(0, budget - reserve), model)
+    folded = 0
+
+    def _block(i, text):
+        nonlocal summary, folded
+        summary, folded = text, i
+        if on_block:
+            on_block(i, text)
+
+    try:
+        fold_blocks(client, summary, turns[:end], on_block=_block)
+    except Exception as e:
+        logging.warning(f"Context summary failed, keeping the summary folded so far: {e}")
+    # Token estimates may disagree with max_tokens: keep the newest turns that still fit
+    left = budget - (count_tokens(summary, model) + MESSAGE_OVERHEAD_TOKENS if summary else 0)
+    return summary, folded, folded + split_by_budget(turns[folded:], max(0, left), model, block=1)
+
+
+def window_history(client, turns, budget: int = CONTEXT_TOKEN_BUDGET, model: str | None = None,
+                   summary: str = "", summarized: int = 0):
+    """
+    Windowing for callers that hold the whole history (e.g. get_reply).
+    Returns (summary, recent_turns, summarized) whose summary and turns together
+    stay within budget; turns[:summarized] are covered by the summary. Passing
+    the returned summary and summarized back in on the next call folds only
+    turns the summary has not seen; without them older blocks are re-folded
+    through the LLM cache.
+    """
+    summarized = max(0, min(summarized, len(turns))) if summary else 0
+    summary, folded, start = _window(client, summary, turns[summarized:], budget, model)
+    return summary, list(turns[summarized + start:]), summarized + folded
+
+
+def run_chat_window(client, run_id: str, budget: int = CONTEXT_TOKEN_BUDGET, model: str | None = None):
+    """
+    Windowed chat history of a run. Loads only messages newer than the latest
+    stored summary, folds whatever no longer fits the budget and stores each new
+    summary in chat_summaries. Returns (summary, recent_messages).
+    """
+    from .db_utils import get_chat_by_run, get_latest_chat_summary, save_chat_summary
+
+    stored = get_latest_chat_summary(run_id)
+    summary = stored["summary"] if stored else ""
+    messages = get_chat_by_run(run_id, after_id=stored["through_message_id"] if stored else None)
+
+    def save(end, text):
+        save_chat_summary(run_id, messages[end - 1]["id"], text, count_tokens(text, model))
+
+    summary, _, start = _window(client, summary, messages, budget, model, on_block=save)
+    return summary, messages[start:]
+
+
+def render_history(summary: str, turns) -> str:
+    """Plain-text history block for a prompt."""
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier discussion:\n{summary}")
+    if turns:
+        parts.append("\n".join(turn_text(t) for t in turns))
+    return "\n\n".join(parts)
@@ -1,16 +1,24 @@
 import os
 import json
 import uuid
+import random
+import hashlib
+from datetime import datetime, timedelta
 from contextlib import contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
 
 from sqlalchemy import (
     create_engine, MetaData, Table, Column, Integer, BigInteger, Text, DateTime,
-    ForeignKey, func, select, String
+    ForeignKey, func, select, insert, update, String, Float, UniqueConstraint, Index
 )
 from sqlalchemy.types import JSON
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .persona_prompt import PERSONA_FIELDS, render_persona_description
+from .processed_store import url_hash
 
 # If you use Pydantic Persona elsewhere
 try:
@@ -26,10 +34,29 @@ DATABASE_URL = os.environ["DATABASE_URL"]
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+psycopg2://", 1)
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# Pool per process: with gunicorn, workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay
+# below the server's max_connections (Heroku hobby/basic: 20).
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))  # seconds, < server idle timeout
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") != "0"
+
+
+def _engine_options(url: str) -> dict:
+    opts = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if not url.startswith("sqlite"):  # SQLite pools do not take sizing arguments
+        opts.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return opts
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 Base = declarative_base(metadata=MetaData(schema=None))  # default public schema
 
+# BIGSERIAL on PostgreSQL; SQLite only autoincrements an INTEGER PRIMARY KEY (local / offline runs)
+BigId = BigInteger().with_variant(Integer, "sqlite")
+
 # --- Models ---
 class Population(Base):
     __tablename__ = "populations"
@@ -43,7 +70,7 @@ class Population(Base):
 
 class PersonaRow(Base):
     __tablename__ = "personas"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigId, primary_key=True, autoincrement=True)
     population_id = Column(Integer, ForeignKey("populations.id", ondelete="CASCADE"), index=True)
 
     # Core attributes (NOT NULL -> anna vähintään tyhjät arvot tallennettaessa)
@@ -66,19 +93,29 @@ class PersonaRow(Base):
     perspective_on_change = Column(Text)
     daily_routine = Column(Text)
 
+    # Canonical prompt description, rendered once at insert (see persona_prompt.py)
+    prompt_text = Column(Text)
+
+    # Uniform random key for indexed random sampling (see sample_personas)
+    rand_key = Column(Float, nullable=False, default=random.random)
+
     population = relationship("Population", back_populates="personas")
 
+    __table_args__ = (
+        Index("ix_personas_population_rand", "population_id", "rand_key"),
+    )
+
 
 class Discussion(Base):
     __tablename__ = "discussions"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigId, primary_key=True, autoincrement=True)
     population = Column(Text, nullable=False)  # string key preserved
     discussion_data = Column(JSONB, nullable=False)
 
 
 class NpsResult(Base):
     __tablename__ = "nps_results"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigId, primary_key=True, autoincrement=True)
     population = Column(Text, nullable=False)  # string key preserved
     nps_data = Column(JSONB, nullable=False)
 
@@ -90,6 +127,10 @@ class UserSession(Base):
     lang = Column(Text, default="en", nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        Index("ix_user_sessions_created_at", created_at),
+    )
+
 
 class Run(Base):
     __tablename__ = "runs"
@@ -102,10 +143,15 @@ class Run(Base):
     session = relationship("UserSession")
     population = relationship("Population")
 
+    __table_args__ = (
+        Index("ix_runs_session_created", session_id, created_at.desc()),
+        Index("ix_runs_created_at", created_at),
+    )
+
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigId, primary_key=True, autoincrement=True)
     run_id = Column(String, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
     persona_id = Column(BigInteger, ForeignKey("personas.id", ondelete="SET NULL"), nullable=True)
     author = Column(Text, nullable=False)  # 'persona' / 'system' / 'user' / tms.
@@ -116,20 +162,177 @@ class ChatMessage(Base):
     run = relationship("Run")
     persona = relationship("PersonaRow")
 
+    __table_args__ = (
+        Index("ix_chat_messages_run_created", run_id, created_at.desc()),
+    )
+
+
+class ChatSummary(Base):
+    """Rolling summary of a run's chat up to (and including) through_message_id."""
+    __tablename__ = "chat_summaries"
+    id = Column(BigId, primary_key=True, autoincrement=True)
+    run_id = Column(String, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
+    through_message_id = Column(BigInteger, nullable=False)
+    summary = Column(Text, nullable=False)
+    tokens = Column(Integer, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("run_id", "through_message_id", name="uq_chat_summaries_run_through"),
+    )
+
 
 class NewsAnalysis(Base):
     __tablename__ = "news_analysis"
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    id = Column(BigId, primary_key=True, autoincrement=True)
     run_id = Column(String, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
     result_json = Column(JSONB, nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
     run = relationship("Run")
 
+    __table_args__ = (
+        Index("ix_news_analysis_run_created", run_id, created_at.desc()),
+    )
+
+
+class Article(Base):
+    """One row per news article, shared by every snapshot that links to it."""
+    __tablename__ = "articles"
+    id = Column(BigId, primary_key=True, autoincrement=True)
+    url_hash = Column(String(64), nullable=False, unique=True)  # sha256 of the normalized URL
+    url = Column(Text)
+    title = Column(Text)
+    publisher = Column(Text)
+    published = Column(Text)  # as given by the source
+    first_seen_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # News index (models/news_index.py); on PostgreSQL also a generated search_vector (migration 009)
+    summary = Column(Text)
+    source = Column(Text)  # feed URL, "gnews" or "fixture:<file>"
+    published_at = Column(DateTime, index=True)  # UTC, parsed from published
+
+
+class NewsIngestState(Base):
+    """Last claim per news ingest job, so one process at a time fetches the feeds."""
+    __tablename__ = "news_ingest_state"
+    key = Column(Text, primary_key=True)
+    claimed_at = Column(DateTime, nullable=False)  # UTC
+
+
+class RunArticle(Base):
+    """Ranked articles of one news_analysis snapshot."""
+    __tablename__ = "run_articles"
+    news_analysis_id = Column(BigInteger, ForeignKey("news_analysis.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    run_id = Column(String, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False, index=True)
+    article_id = Column(BigInteger, ForeignKey("articles.id", ondelete="CASCADE"), nullable=False, index=True)
+
+
+class NewsCache(Base):
+    """Shared GNews lookups keyed by normalized query + language + country."""
+    __tablename__ = "news_cache"
+    id = Column(BigId, primary_key=True, autoincrement=True)
+    query = Column(Text, nullable=False)
+    language = Column(String(8), nullable=False)
+    country = Column(String(8), nullable=False)
+    max_results = Column(Integer, nullable=False)
+    articles = Column(JSONB, nullable=False)
+    fetched_at = Column(DateTime, nullable=False)  # UTC, set by the writer
+
+    __table_args__ = (
+        UniqueConstraint("query", "language", "country", name="uq_news_cache_key"),
+    )
+
+
+class LLMCacheEntry(Base):
+    """Durable tier of models/llm_cache.py (epoch-second timestamps)."""
+    __tablename__ = "llm_cache"
+    key = Column(String(64), primary_key=True)  # sha256 of the request parameters
+    value = Column(Text, nullable=False)  # completion JSON
+    created_at = Column(Float, nullable=False, index=True)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+class RunReview(Base):
+    __tablename__ = "run_reviews"
+    id = Column(BigId, primary_key=True, autoincrement=True)
+    run_id = Column(String, ForeignKey("runs.id", ondelete="CASCADE"), nullable=False, index=True)
+    dt_filename = Column(Text, nullable=False)
+    dt_hash = Column(String(64), nullable=False)  # sha256 of the DT body
+    model = Column(Text, nullable=False)
+    score = Column(Integer, nullable=False)
+    decision = Column(Text, nullable=False)
+    confidence = Column(Float, nullable=False)
+    reason = Column(Text)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    run = relationship("Run")
+
+    __table_args__ = (
+        UniqueConstraint("run_id", "dt_filename", "dt_hash", "model", name="uq_run_reviews_key"),
+    )
+
+
+class RetentionArchive(Base):
+    """Rows deleted by models/retention.py, kept as JSONB (append-only, cold)."""
+    __tablename__ = "retention_archive"
+    id = Column(BigId, primary_key=True, autoincrement=True)
+    table_name = Column(Text, nullable=False)
+    row_id = Column(Text, nullable=False)
+    data = Column(JSONB, nullable=False)
+    archived_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_retention_archive_table_row", table_name, row_id),
+    )
+
+
+class RunJob(Base):
+    __tablename__ = "run_jobs"
+    run_id = Column(String, ForeignKey("runs.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(Text, nullable=False, default="queued")  # queued/running/done/rejected/failed
+    stages = Column(JSONB, nullable=False)  # [{"name", "status", "done", "total"}, ...]
+    error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    run = relationship("Run")
+
 
 # --- Session helper ---
+class _UnitOfWork:
+    """One lazily opened session shared by every get_session() in the unit."""
+
+    def __init__(self):
+        self.session = None
+
+    def get(self):
+        if self.session is None:
+            self.session = SessionLocal()
+        return self.session
+
+
+_current_unit: ContextVar[_UnitOfWork | None] = ContextVar("db_unit_of_work", default=None)
+
+
 @contextmanager
 def get_session():
+    unit = _current_unit.get()
+    if unit is not None:
+        # Inside a unit of work: flush only, the unit commits once at the end.
+        # Each block runs in a SAVEPOINT, so an error rolls back only this block
+        # and a caller that catches it keeps the unit's earlier writes.
+        session = unit.get()
+        savepoint = session.begin_nested()
+        try:
+            yield session
+            session.flush()
+            savepoint.commit()
+        except Exception:
+            savepoint.rollback()
+            raise
+        return
+
     session = SessionLocal()
     try:
         yield session
@@ -141,10 +344,83 @@ def get_session():
         session.close()
 
 
+def begin_unit_of_work():
+    """Start a unit of work in the current context (no-op if one is already active)."""
+    if _current_unit.get() is None:
+        _current_unit.set(_UnitOfWork())
+
+
+def commit_unit_of_work():
+    """Commit what the current unit has done so far (e.g. before handing a run to another thread)."""
+    unit = _current_unit.get()
+    if unit is not None and unit.session is not None:
+        unit.session.commit()
+
+
+def end_unit_of_work(commit: bool = True):
+    """Commit (or roll back) and close the current unit of work."""
+    unit = _current_unit.get()
+    if unit is None:
+        return
+    _current_unit.set(None)
+    if unit.session is None:
+        return
+    try:
+        if commit:
+            unit.session.commit()
+        else:
+            unit.session.rollback()
+    finally:
+        unit.session.close()
+
+
+@contextmanager
+def unit_of_work():
+    """
+    All db_utils calls inside share one connection and one commit. Nests by
+    joining the outer unit; a failing db_utils call only undoes its own savepoint.
+    """
+    if _current_unit.get() is not None:
+        yield
+        return
+    begin_unit_of_work()
+    try:
+        yield
+    except Exception:
+        end_unit_of_work(commit=False)
+        raise
+    end_unit_of_work()
+
+
+def bind_unit_of_work(app):
+    """
+    Run each Flask request in one unit of work: committed in after_request (so a
+    failed commit still turns into a 500) unless the response is a 5xx, and
+    rolled back in teardown otherwise. Streamed response bodies run after the
+    request and use their own sessions.
+    """
+    @app.before_request
+    def _begin_db_unit():
+        begin_unit_of_work()
+
+    @app.after_request
+    def _commit_db_unit(response):
+        if response.status_code < 500:
+            commit_unit_of_work()
+        return response
+
+    @app.teardown_request
+    def _end_db_unit(exc=None):
+        end_unit_of_work(commit=False)  # already committed in after_request unless the request failed
+
+    return app
+
+
 # --- Schema management ---
 def setup_database():
-    """Create all tables idempotently."""
-    Base.metadata.create_all(engine)
+    """Apply pending schema migrations (see models/migrations.py). Meant for deploy/CLI, not import time."""
+    from .migrations import migrate
+    return migrate()
 
 
 # --- Utility: get or create a Population by name ---
@@ -162,49 +438,147 @@ def _get_or_create_population(session, name: str, location: str | None = None) -
 
 # --- Public API ---
 
+def _article_row(a: dict) -> dict:
+    url = a.get("url") or None
+    if url:
+        key = url_hash(url)
+    else:
+        # Articles without a URL are keyed by title + publisher instead
+        key = hashlib.sha256(f"{a.get('title') or ''}|{a.get('publisher') or ''}".encode("utf-8")).hexdigest()
+    return {
+        "url_hash": key,
+        "url": url,
+        "title": a.get("title"),
+        "publisher": a.get("publisher"),
+        "published": a.get("published"),
+    }
+
+
+def _upsert_articles(session, articles: list[dict]) -> list[int]:
+    """Insert unseen articles (ON CONFLICT DO NOTHING) and return ids in input order."""
+    rows = [_article_row(a) for a in articles]
+    if not rows:
+        return []
+    dialect_insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    unique = list({r["url_hash"]: r for r in rows}.values())
+    session.execute(dialect_insert(Article).on_conflict_do_nothing(index_elements=["url_hash"]), unique)
+    ids = dict(session.execute(
+        select(Article.url_hash, Article.id).where(Article.url_hash.in_([r["url_hash"] for r in unique]))
+    ).all())
+    return [ids[r["url_hash"]] for r in rows]
+
+
+def _link_articles(session, news_analysis_id: int, run_id: str, articles: list[dict]):
+    article_ids = _upsert_articles(session, articles)
+    if article_ids:
+        session.execute(insert(RunArticle), [
+            {"news_analysis_id": news_analysis_id, "rank": rank, "run_id": run_id, "article_id": aid}
+            for rank, aid in enumerate(article_ids)
+        ])
+
+
+def _article_dict(r) -> dict:
+    return {"title": r.title, "publisher": r.publisher or "", "published": r.published or "", "url": r.url}
+
+
 def get_news_analysis(run_id: str):
+    """
+    Latest snapshot of a run in its original shape. Articles live in
+    articles / run_articles and are joined back in rank order; legacy rows
+    that still embed "articles" are returned as stored.
+    """
+    latest = (
+        select(NewsAnalysis.id)
+        .where(NewsAnalysis.run_id == run_id)
+        .order_by(NewsAnalysis.created_at.desc(), NewsAnalysis.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    with get_session() as s:
+        rows = s.execute(
+            select(NewsAnalysis.result_json, Article.title, Article.publisher, Article.published, Article.url)
+            .select_from(NewsAnalysis)
+            .outerjoin(RunArticle, RunArticle.news_analysis_id == NewsAnalysis.id)
+            .outerjoin(Article, Article.id == RunArticle.article_id)
+            .where(NewsAnalysis.id == latest)
+            .order_by(RunArticle.rank)
+        ).all()
+    if not rows:
+        return None
+    snapshot = dict(rows[0].result_json)
+    if "articles" not in snapshot:
+        snapshot["articles"] = [_article_dict(r) for r in rows if r.title is not None or r.url is not None]
+    return snapshot
+
+
+def get_news_analysis_articles(news_analysis_ids) -> dict:
+    """{news_analysis_id: [article dicts in rank order]} for the given snapshots."""
+    ids = list(news_analysis_ids)
+    if not ids:
+        return {}
+    with get_session() as s:
+        rows = s.execute(
+            select(RunArticle.news_analysis_id, Article.title, Article.publisher, Article.published, Article.url)
+            .join(Article, Article.id == RunArticle.article_id)
+            .where(RunArticle.news_analysis_id.in_(ids))
+            .order_by(RunArticle.news_analysis_id, RunArticle.rank)
+        ).all()
+    out = {}
+    for r in rows:
+        out.setdefault(r.news_analysis_id, []).append(_article_dict(r))
+    return out
+
+def get_cached_news(query: str, language: str, country: str, max_age_seconds: float, min_results: int = 0):
+    """Return cached articles for the key if fresher than max_age_seconds, else None."""
     with get_session() as s:
         row = s.execute(
-            select(NewsAnalysis)
-            .where(NewsAnalysis.run_id == run_id)
-            .order_by(NewsAnalysis.created_at.desc())
-            .limit(1)
+            select(NewsCache).where(
+                NewsCache.query == query,
+                NewsCache.language == language,
+                NewsCache.country == country,
+            )
+        ).scalars().first()
+        if not row or row.max_results < min_results:
+            return None
+        if row.fetched_at < datetime.utcnow() - timedelta(seconds=max_age_seconds):
+            return None
+        return row.articles
+
+def save_cached_news(query: str, language: str, country: str, max_results: int, articles: list):
+    with get_session() as s:
+        row = s.execute(
+            select(NewsCache).where(
+                NewsCache.query == query,
+                NewsCache.language == language,
+                NewsCache.country == country,
+            )
         ).scalars().first()
-        return row.result_json if row else None
+        if row is None:
+            row = NewsCache(query=query, language=language, country=country)
+            s.add(row)
+        row.max_results = max_results
+        row.articles = articles
+        row.fetched_at = datetime.utcnow()
+        s.flush()
+        return row.id
 
 def save_population(name, location, personas):
     """
     Create a population and insert given personas (list of objects/dicts).
     Returns population_id.
     """
+    pop_id, _ = bulk_insert_personas(name, personas, location=location)
+    return pop_id
+
+
+def count_personas(population_name: str) -> int:
+    """Number of personas already stored for a population (0 if it does not exist)."""
     with get_session() as s:
-        pop = _get_or_create_population(s, name=name, location=location)
-        for p in personas:
-            pdict = (
-                p.model_dump() if hasattr(p, "model_dump")
-                else (p.dict() if hasattr(p, "dict") else dict(p))
-            )
-            s.add(PersonaRow(
-                population_id=pop.id,
-                name=pdict.get("name") or "",
-                age=int(pdict.get("age")) if pdict.get("age") is not None else 0,
-                gender=pdict.get("gender") or "",
-                orientation=pdict.get("orientation") or "",
-                location=pdict.get("location") or "",
-                mbti_type=pdict.get("mbti_type") or "",
-                occupation=pdict.get("occupation"),
-                education=pdict.get("education"),
-                income_level=pdict.get("income_level"),
-                financial_security=pdict.get("financial_security"),
-                main_concern=pdict.get("main_concern"),
-                source_of_joy=pdict.get("source_of_joy"),
-                social_ties=pdict.get("social_ties"),
-                values_and_beliefs=pdict.get("values_and_beliefs"),
-                perspective_on_change=pdict.get("perspective_on_change"),
-                daily_routine=pdict.get("daily_routine"),
-            ))
-        s.flush()
-        return pop.id
+        return s.execute(
+            select(func.count(PersonaRow.id))
+            .join(Population, PersonaRow.population_id == Population.id)
+            .where(Population.name == population_name)
+        ).scalar_one()
 
 
 def get_all_populations():
@@ -253,6 +627,15 @@ def save_discussion_data_to_db(population, discussion_data):
         return row.id
 
 
+def update_discussion_data_in_db(discussion_id, discussion_data):
+    """Overwrite discussion_data of an existing row (used to save transcripts round by round)."""
+    with get_session() as s:
+        row = s.get(Discussion, discussion_id)
+        if row:
+            row.discussion_data = json.loads(json.dumps(discussion_data))  # fresh object so the change is tracked
+        return discussion_id
+
+
 def get_discussion_data_from_db(discussion_id):
     with get_session() as s:
         row = s.get(Discussion, discussion_id)
@@ -267,6 +650,15 @@ def save_nps_results_to_db(population, nps_results):
         return row.id
 
 
+def update_nps_results_in_db(nps_id, nps_results):
+    """Overwrite nps_data of an existing row (used to stream partial results)."""
+    with get_session() as s:
+        row = s.get(NpsResult, nps_id)
+        if row:
+            row.nps_data = json.loads(json.dumps(nps_results))  # fresh object so the change is tracked
+        return nps_id
+
+
 def get_nps_results_from_db(nps_id):
     with get_session() as s:
         row = s.get(NpsResult, nps_id)
@@ -275,39 +667,362 @@ def get_nps_results_from_db(nps_id):
 
 def save_persona_to_db(persona, population_name):
     """Save a single persona under population_name. Returns persona id."""
+    _, ids = bulk_insert_personas(population_name, [persona])
+    return ids[0]
+
+
+# Persona columns in insert order; NOT NULL text columns default to "" and age to 0
+PERSONA_REQUIRED_TEXT = ("name", "gender", "orientation", "location", "mbti_type")
+PERSONA_OPTIONAL_TEXT = (
+    "occupation", "education", "income_level", "financial_security", "main_concern",
+    "source_of_joy", "social_ties", "values_and_beliefs", "perspective_on_change", "daily_routine",
+)
+
+
+def _persona_row(p, population_id: int) -> dict:
+    """Column dict for one persona; reads dicts and pydantic/ORM objects without model_dump()."""
+    get = p.get if isinstance(p, dict) else (lambda k: getattr(p, k, None))
+    age = get("age")
+    row = {"population_id": population_id, "age": int(age) if age is not None else 0}
+    for k in PERSONA_REQUIRED_TEXT:
+        row[k] = get(k) or ""
+    for k in PERSONA_OPTIONAL_TEXT:
+        row[k] = get(k)
+    row["prompt_text"] = render_persona_description(row)
+    return row
+
+
+def bulk_insert_personas(population_name: str, personas, location: str | None = None):
+    """
+    Upsert the population once and insert all personas with multi-row
+    INSERT ... VALUES ... RETURNING id (batched by the driver).
+    Accepts pydantic Persona objects and dicts. Returns (population_id, [persona ids])
+    with ids in input order.
+    """
     with get_session() as s:
-        pop = _get_or_create_population(s, name=population_name, location=None)
-        if hasattr(persona, "model_dump"):
-            pdata = persona.model_dump()
-        elif hasattr(persona, "dict"):
-            pdata = persona.dict()
-        else:
-            pdata = dict(persona)
-
-        row = PersonaRow(
-            population_id=pop.id,
-            name=pdata.get("name") or "",
-            age=int(pdata.get("age")) if pdata.get("age") is not None else 0,
-            gender=pdata.get("gender") or "",
-            orientation=pdata.get("orientation") or "",
-            location=pdata.get("location") or "",
-            mbti_type=pdata.get("mbti_type") or "",
-            occupation=pdata.get("occupation"),
-            education=pdata.get("education"),
-            income_level=pdata.get("income_level"),
-            financial_security=pdata.get("financial_security"),
-            main_concern=pdata.get("main_concern"),
-            source_of_joy=pdata.get("source_of_joy"),
-            social_ties=pdata.get("social_ties"),
-            values_and_beliefs=pdata.get("values_and_beliefs"),
-            perspective_on_change=pdata.get("perspective_on_change"),
-            daily_routine=pdata.get("daily_routine"),
+        pop = _get_or_create_population(s, name=population_name, location=location)
+        rows = [_persona_row(p, pop.id) for p in personas]
+        if not rows:
+            return pop.id, []
+        ids = s.execute(
+            insert(PersonaRow).returning(PersonaRow.id, sort_by_parameter_order=True),
+            rows,
+        ).scalars().all()
+        return pop.id, list(ids)
+
+
+def backfill_persona_prompts(batch_size: int = 500) -> int:
+    """Render prompt_text for personas that do not have it yet. Returns rows updated."""
+    cols = [PersonaRow.id] + [getattr(PersonaRow, k) for k, _ in PERSONA_FIELDS]
+    updated, after_id = 0, 0
+    while True:
+        with get_session() as s:
+            rows = s.execute(
+                select(*cols).where(PersonaRow.prompt_text.is_(None), PersonaRow.id > after_id)
+                .order_by(PersonaRow.id).limit(batch_size)
+            ).all()
+            if not rows:
+                return updated
+            s.execute(
+                update(PersonaRow),
+                [{"id": r.id, "prompt_text": render_persona_description(dict(r._mapping))} for r in rows],
+            )
+        updated += len(rows)
+        after_id = rows[-1].id
+
+
+# --- Persona query API (filter / projection / keyset paging / SQL sampling) ---
+
+PERSONA_COLUMNS = tuple(
+    c.name for c in PersonaRow.__table__.columns if c.name != "rand_key"
+)
+
+
+def _persona_select(population_name: str | None, columns):
+    columns = tuple(columns or PERSONA_COLUMNS)
+    unknown = set(columns) - set(PERSONA_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown persona columns: {sorted(unknown)}")
+    # id is always selected: it is the keyset cursor
+    cols = [PersonaRow.id] + [getattr(PersonaRow, c) for c in columns if c != "id"]
+    stmt = select(*cols)
+    if population_name is not None:
+        stmt = stmt.join(Population, PersonaRow.population_id == Population.id).where(
+            Population.name == population_name
         )
+    return stmt
+
+
+def get_personas_page(population_name: str | None = None, columns=None,
+                      after_id: int | None = None, limit: int = 100):
+    """
+    One keyset page of personas ordered by id.
+    Returns (rows, next_after_id); next_after_id is None on the last page.
+    """
+    stmt = _persona_select(population_name, columns)
+    if after_id is not None:
+        stmt = stmt.where(PersonaRow.id > after_id)
+    stmt = stmt.order_by(PersonaRow.id).limit(limit)
+    with get_session() as s:
+        rows = [dict(r._mapping) for r in s.execute(stmt)]
+    next_after = rows[-1]["id"] if len(rows) == limit else None
+    return rows, next_after
+
+
+def iter_personas(population_name: str | None = None, columns=None, page_size: int = 500):
+    """Stream persona dicts page by page instead of loading every persona at once."""
+    after_id = None
+    while True:
+        rows, after_id = get_personas_page(population_name, columns, after_id, page_size)
+        yield from rows
+        if after_id is None:
+            return
+
+
+def sample_personas(population_name: str, k: int = 1, columns=None):
+    """
+    k distinct personas of a population at random. Each draw seeks the
+    (population_id, rand_key) index to the first key >= a random number
+    (wrapping around to the smallest key), so a draw costs one index lookup
+    whatever the population size; duplicates are redrawn. If the population is
+    too small for k distinct draws, the rest are filled in rand_key order.
+    """
+    with get_session() as s:
+        population_id = s.execute(
+            select(Population.id).where(Population.name == population_name)
+        ).scalar()
+        if population_id is None:
+            return []
+        base = _persona_select(None, columns).where(PersonaRow.population_id == population_id)
+        rows, seen = [], set()
+        for _ in range(4 * k + 8):
+            if len(rows) >= k:
+                break
+            row = s.execute(
+                base.where(PersonaRow.rand_key >= random.random()).order_by(PersonaRow.rand_key).limit(1)
+            ).first() or s.execute(base.order_by(PersonaRow.rand_key).limit(1)).first()
+            if row is None:
+                return []  # empty population
+            if row.id not in seen:
+                seen.add(row.id)
+                rows.append(dict(row._mapping))
+        if len(rows) < k:
+            rest = base.where(PersonaRow.id.notin_(seen)).order_by(PersonaRow.rand_key).limit(k - len(rows))
+            rows.extend(dict(r._mapping) for r in s.execute(rest))
+    return rows
+
+
+def get_personas_by_population_id(population_id):
+    """Return all persona dicts for a population_id."""
+    with get_session() as s:
+        rows = s.execute(
+            select(PersonaRow).where(PersonaRow.population_id == population_id)
+        ).scalars().all()
+        return [{
+            "id": r.id,
+            "population_id": r.population_id,
+            "name": r.name,
+            "age": r.age,
+            "gender": r.gender,
+            "orientation": r.orientation,
+            "location": r.location,
+            "mbti_type": r.mbti_type,
+            "occupation": r.occupation,
+            "education": r.education,
+            "income_level": r.income_level,
+            "financial_security": r.financial_security,
+            "main_concern": r.main_concern,
+            "source_of_joy": r.source_of_joy,
+            "social_ties": r.social_ties,
+            "values_and_beliefs": r.values_and_beliefs,
+            "perspective_on_change": r.perspective_on_change,
+            "daily_routine": r.daily_routine,
+        } for r in rows]
+
+
+def save_discussion_data_to_db(population, discussion_data):
+    with get_session() as s:
+        row = Discussion(population=population, discussion_data=discussion_data)
         s.add(row)
         s.flush()
         return row.id
 
 
+def update_discussion_data_in_db(discussion_id, discussion_data):
+    """Overwrite discussion_data of an existing row (used to save transcripts round by round)."""
+    with get_session() as s:
+        row = s.get(Discussion, discussion_id)
+        if row:
+            row.discussion_data = json.loads(json.dumps(discussion_data))  # fresh object so the change is tracked
+        return discussion_id
+
+
+def get_discussion_data_from_db(discussion_id):
+    with get_session() as s:
+        row = s.get(Discussion, discussion_id)
+        return row.discussion_data if row else None
+
+
+def save_nps_results_to_db(population, nps_results):
+    with get_session() as s:
+        row = NpsResult(population=population, nps_data=nps_results)
+        s.add(row)
+        s.flush()
+        return row.id
+
+
+def update_nps_results_in_db(nps_id, nps_results):
+    """Overwrite nps_data of an existing row (used to stream partial results)."""
+    with get_session() as s:
+        row = s.get(NpsResult, nps_id)
+        if row:
+            row.nps_data = json.loads(json.dumps(nps_results))  # fresh object so the change is tracked
+        return nps_id
+
+
+def get_nps_results_from_db(nps_id):
+    with get_session() as s:
+        row = s.get(NpsResult, nps_id)
+        return row.nps_data if row else None
+
+
+def save_persona_to_db(persona, population_name):
+    """Save a single persona under population_name. Returns persona id."""
+    _, ids = bulk_insert_personas(population_name, [persona])
+    return ids[0]
+
+
+# Persona columns in insert order; NOT NULL text columns default to "" and age to 0
+PERSONA_REQUIRED_TEXT = ("name", "gender", "orientation", "location", "mbti_type")
+PERSONA_OPTIONAL_TEXT = (
+    "occupation", "education", "income_level", "financial_security", "main_concern",
+    "source_of_joy", "social_ties", "values_and_beliefs", "perspective_on_change", "daily_routine",
+)
+
+
+def _persona_row(p, population_id: int) -> dict:
+    """Column dict for one persona; reads dicts and pydantic/ORM objects without model_dump()."""
+    get = p.get if isinstance(p, dict) else (lambda k: getattr(p, k, None))
+    age = get("age")
+    row = {"population_id": population_id, "age": int(age) if age is not None else 0}
+    for k in PERSONA_REQUIRED_TEXT:
+        row[k] = get(k) or ""
+    for k in PERSONA_OPTIONAL_TEXT:
+        row[k] = get(k)
+    row["prompt_text"] = render_persona_description(row)
+    return row
+
+
+def bulk_insert_personas(population_name: str, personas, location: str | None = None):
+    """
+    Upsert the population once and insert all personas with multi-row
+    INSERT ... VALUES ... RETURNING id (batched by the driver).
+    Accepts pydantic Persona objects and dicts. Returns (population_id, [persona ids])
+    with ids in input order.
+    """
+    with get_session() as s:
+        pop = _get_or_create_population(s, name=population_name, location=location)
+        rows = [_persona_row(p, pop.id) for p in personas]
+        if not rows:
+            return pop.id, []
+        ids = s.execute(
+            insert(PersonaRow).returning(PersonaRow.id, sort_by_parameter_order=True),
+            rows,
+        ).scalars().all()
+        return pop.id, list(ids)
+
+
+def backfill_persona_prompts(batch_size: int = 500) -> int:
+    """Render prompt_text for personas that do not have it yet. Returns rows updated."""
+    cols = [PersonaRow.id] + [getattr(PersonaRow, k) for k, _ in PERSONA_FIELDS]
+    updated, after_id = 0, 0
+    while True:
+        with get_session() as s:
+            rows = s.execute(
+                select(*cols).where(PersonaRow.prompt_text.is_(None), PersonaRow.id > after_id)
+                .order_by(PersonaRow.id).limit(batch_size)
+            ).all()
+            if not rows:
+                return updated
+            s.execute(
+                update(PersonaRow),
+                [{"id": r.id, "prompt_text": render_persona_description(dict(r._mapping))} for r in rows],
+            )
+        updated += len(rows)
+        after_id = rows[-1].id
+
+
+# --- Persona query API (filter / projection / keyset paging / SQL sampling) ---
+
+PERSONA_COLUMNS = tuple(
+    c.name for c in PersonaRow.__table__.columns if c.name != "rand_key"
+)
+
+
+def _persona_select(population_name: str | None, columns):
+    columns = tuple(columns or PERSONA_COLUMNS)
+    unknown = set(columns) - set(PERSONA_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown persona columns: {sorted(unknown)}")
+    # id is always selected: it is the keyset cursor
+    cols = [PersonaRow.id] + [getattr(PersonaRow, c) for c in columns if c != "id"]
+    stmt = select(*cols)
+    if population_name is not None:
+        stmt = stmt.join(Population, PersonaRow.population_id == Population.id).where(
+            Population.name == population_name
+        )
+    return stmt
+
+
+def get_personas_page(population_name: str | None = None, columns=None,
+                      after_id: int | None = None, limit: int = 100):
+    """
+    One keyset page of personas ordered by id.
+    Returns (rows, next_after_id); next_after_id is None on the last page.
+    """
+    stmt = _persona_select(population_name, columns)
+    if after_id is not None:
+        stmt = stmt.where(PersonaRow.id > after_id)
+    stmt = stmt.order_by(PersonaRow.id).limit(limit)
+    with get_session() as s:
+        rows = [dict(r._mapping) for r in s.execute(stmt)]
+    next_after = rows[-1]["id"] if len(rows) == limit else None
+    return rows, next_after
+
+
+def iter_personas(population_name: str | None = None, columns=None, page_size: int = 500):
+    """Stream persona dicts page by page instead of loading every persona at once."""
+    after_id = None
+    while True:
+        rows, after_id = get_personas_page(population_name, columns, after_id, page_size)
+        yield from rows
+        if after_id is None:
+            return
+
+
+def sample_personas(population_name: str, k: int = 1, columns=None):
+    """
+    k distinct personas of a population, uniformly at random: draw k distinct
+    ranks in [0, population size) and fetch each with OFFSET along the
+    (population_id, rand_key) index. Unlike seeking to a random rand_key, this
+    does not favour personas that follow large gaps between keys, and
+    draws are independent of each other.
+    """
+    base = _persona_select(population_name, columns)
+    with get_session() as s:
+        n = s.execute(
+            select(func.count()).select_from(PersonaRow)
+            .join(Population, PersonaRow.population_id == Population.id)
+            .where(Population.name == population_name)
+        ).scalar_one()
+        rows = []
+        for rank in random.sample(range(n), min(k, n)):
+            row = s.execute(base.order_by(PersonaRow.rand_key).offset(rank).limit(1)).first()
+            if row is not None:  # population shrank meanwhile
+                rows.append(dict(row._mapping))
+    return rows
+
+
 def get_personas_by_population():
     """Return dict: { population_name: [ persona_dict, ... ], ... }"""
     with get_session() as s:
@@ -397,24 +1112,197 @@ def add_chat_message(run_id: str, author: str, text: str, score: int | None = No
         s.flush()
         return m.id
 
-def get_chat_by_run(run_id: str):
+def get_chat_by_run(run_id: str, after_id: int | None = None):
+    """Chat of a run in order; after_id skips messages already covered by a summary."""
+    stmt = select(ChatMessage.id, ChatMessage.author, ChatMessage.text, ChatMessage.score).where(
+        ChatMessage.run_id == run_id
+    )
+    if after_id is not None:
+        stmt = stmt.where(ChatMessage.id > after_id)
     with get_session() as s:
-        rows = s.execute(
-            select(ChatMessage.author, ChatMessage.text, ChatMessage.score)
-            .where(ChatMessage.run_id == run_id)
-            .order_by(ChatMessage.created_at.asc())
-        ).all()
-        return [{"name": r.author, "text": r.text, "score": r.score} for r in rows]
+        rows = s.execute(stmt.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())).all()
+        return [{"id": r.id, "name": r.author, "text": r.text, "score": r.score} for r in rows]
+
+def get_latest_chat_summary(run_id: str):
+    with get_session() as s:
+        row = s.execute(
+            select(ChatSummary)
+            .where(ChatSummary.run_id == run_id)
+            .order_by(ChatSummary.through_message_id.desc())
+            .limit(1)
+        ).scalars().first()
+        if not row:
+            return None
+        return {"through_message_id": row.through_message_id, "summary": row.summary, "tokens": row.tokens}
+
+def save_chat_summary(run_id: str, through_message_id: int, summary: str, tokens: int | None = None):
+    with get_session() as s:
+        exists = s.execute(
+            select(ChatSummary.id).where(
+                ChatSummary.run_id == run_id, ChatSummary.through_message_id == through_message_id
+            )
+        ).first()
+        if exists:
+            return exists.id
+        row = ChatSummary(run_id=run_id, through_message_id=through_message_id, summary=summary, tokens=tokens)
+        s.add(row)
+        s.flush()
+        return row.id
 
 def save_news_analysis(run_id: str, result_json: dict):
+    """Store the snapshot metadata as JSONB and its articles in articles / run_articles."""
+    result_json = dict(result_json)
+    articles = result_json.pop("articles", None) or []
     with get_session() as s:
         na = NewsAnalysis(run_id=run_id, result_json=result_json)
         s.add(na)
         s.flush()
+        _link_articles(s, na.id, run_id, articles)
         return na.id
 
+
+def compact_news_analysis(batch_size: int = 500) -> int:
+    """Move articles out of legacy snapshots that still embed them. Returns rows compacted."""
+    compacted, after_id = 0, 0
+    while True:
+        with get_session() as s:
+            rows = s.execute(
+                select(NewsAnalysis).where(NewsAnalysis.id > after_id).order_by(NewsAnalysis.id).limit(batch_size)
+            ).scalars().all()
+            if not rows:
+                return compacted
+            for na in rows:
+                if "articles" in (na.result_json or {}):
+                    slim = dict(na.result_json)
+                    articles = slim.pop("articles") or []
+                    na.result_json = slim
+                    _link_articles(s, na.id, na.run_id, articles)
+                    compacted += 1
+            after_id = rows[-1].id
+
 def get_run_content(run_id: str):
     """Palauta runin sisältötekstin (ja halutessa otsikon)."""
     with get_session() as s:
         run = s.get(Run, run_id)
-        return run.content_text if run else ""
\ No newline at end of file
+        return run.content_text if run else ""
+
+def get_run_reviews(run_id: str, model: str):
+    """Return {(dt_filename, dt_hash): review_dict} stored for a run and model."""
+    with get_session() as s:
+        rows = s.execute(
+            select(RunReview).where(RunReview.run_id == run_id, RunReview.model == model)
+        ).scalars().all()
+        return {
+            (r.dt_filename, r.dt_hash): {
+                "score": r.score,
+                "decision": r.decision,
+                "confidence": r.confidence,
+                "reason": r.reason or "",
+            } for r in rows
+        }
+
+def save_run_reviews(run_id: str, model: str, reviews):
+    """
+    Store reviews given as [(dt_filename, dt_hash, review_dict), ...].
+    Keys already present (e.g. written by a concurrent request) are left as is.
+    """
+    with get_session() as s:
+        existing = set(s.execute(
+            select(RunReview.dt_filename, RunReview.dt_hash)
+            .where(RunReview.run_id == run_id, RunReview.model == model)
+        ).all())
+        for fn, h, review in reviews:
+            if (fn, h) in existing:
+                continue
+            existing.add((fn, h))
+            s.add(RunReview(
+                run_id=run_id, dt_filename=fn, dt_hash=h, model=model,
+                score=review["score"], decision=review["decision"],
+                confidence=review["confidence"], reason=review.get("reason"),
+            ))
+
+# --- Background analysis jobs ---
+
+def create_run_job(run_id: str, stage_names: list[str]):
+    with get_session() as s:
+        job = RunJob(
+            run_id=run_id, status="queued",
+            stages=[{"name": n, "status": "pending", "done": 0, "total": 0} for n in stage_names],
+        )
+        s.add(job)
+        s.flush()
+        return job.run_id
+
+def update_run_job(run_id: str, status: str | None = None, stage: str | None = None,
+                   stage_status: str | None = None, done: int | None = None,
+                   total: int | None = None, error: str | None = None):
+    """Update the job status and/or one stage's status/progress counters (also a heartbeat)."""
+    with get_session() as s:
+        job = s.get(RunJob, run_id)
+        if not job:
+            return
+        job.updated_at = func.now()  # even when nothing else changed
+        if status:
+            job.status = status
+        if error is not None:
+            job.error = error
+        if stage:
+            stages = [dict(st) for st in (job.stages or [])]  # new list so the JSON change is tracked
+            for st in stages:
+                if st["name"] == stage:
+                    if stage_status:
+                        st["status"] = stage_status
+                    if done is not None:
+                        st["done"] = done
+                    if total is not None:
+                        st["total"] = total
+            job.stages = stages
+
+def start_run_job(run_id: str) -> bool:
+    """queued -> running. False if the job is gone or no longer queued (e.g. failed as stale)."""
+    with get_session() as s:
+        result = s.execute(
+            update(RunJob)
+            .where(RunJob.run_id == run_id, RunJob.status == "queued")
+            .values(status="running", updated_at=func.now())
+        )
+        return result.rowcount == 1
+
+def touch_run_jobs(run_ids) -> int:
+    """Heartbeat for jobs still queued/running in this process."""
+    run_ids = list(run_ids)
+    if not run_ids:
+        return 0
+    with get_session() as s:
+        result = s.execute(
+            update(RunJob)
+            .where(RunJob.run_id.in_(run_ids), RunJob.status.in_(("queued", "running")))
+            .values(updated_at=func.now())
+        )
+        return result.rowcount
+
+def fail_stale_run_job(run_id: str, stale_after_seconds: float) -> bool:
+    """Mark a queued/running job without a heartbeat for stale_after_seconds as failed."""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after_seconds)
+    with get_session() as s:
+        result = s.execute(
+            update(RunJob)
+            .where(RunJob.run_id == run_id, RunJob.status.in_(("queued", "running")),
+                   RunJob.updated_at < cutoff)
+            .values(status="failed", error="job lost: no heartbeat (worker restarted?)",
+                    updated_at=func.now())
+        )
+        return result.rowcount == 1
+
+def get_run_job(run_id: str):
+    with get_session() as s:
+        job = s.get(RunJob, run_id)
+        if not job:
+            return None
+        return {
+            "run_id": job.run_id,
+            "status": job.status,
+            "stages": job.stages or [],
+            "error": job.error,
+            "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+        }
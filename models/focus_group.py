@@ -1,7 +1,16 @@
 from flask import Flask, request, jsonify
-import random
 import os
-from .db_utils import get_personas_by_population
+import sys
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .db_utils import (
+    sample_personas, save_discussion_data_to_db, update_discussion_data_in_db,
+    get_discussion_data_from_db,
+)
+from .persona_prompt import persona_messages, cached_tokens, PromptUsage
+from .rate_limit import is_retryable, backoff_delay
+from .context_window import SUMMARY_INSTRUCTIONS, CONTEXT_TOKEN_BUDGET, window_history, render_history
 from openai import OpenAI
 from dotenv import load_dotenv
 
@@ -12,54 +21,242 @@ app = Flask(__name__)
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 client = OpenAI(api_key=OPENAI_API_KEY)
 
+FOCUS_GROUP_MODEL = os.getenv('FOCUS_GROUP_MODEL', 'gpt-4o-mini')
+FOCUS_GROUP_CONCURRENCY = int(os.getenv('FOCUS_GROUP_CONCURRENCY', 8))
+FOCUS_GROUP_REPLY_TOKENS = int(os.getenv('FOCUS_GROUP_REPLY_TOKENS', 150))
+FOCUS_GROUP_SUMMARY_TOKENS = int(os.getenv('FOCUS_GROUP_SUMMARY_TOKENS', 300))
+FOCUS_GROUP_MAX_PERSONAS = int(os.getenv('FOCUS_GROUP_MAX_PERSONAS', 12))
+FOCUS_GROUP_MAX_ROUNDS = int(os.getenv('FOCUS_GROUP_MAX_ROUNDS', 6))
+MAX_RETRY_ATTEMPTS = 3
+
+FOCUS_GROUP_INSTRUCTIONS = (
+    "You are talking in a room with people you don't know. "
+    "You discuss with a style that is typical to you."
+)
+
+
+def _complete(messages, max_tokens, temperature=1.0, usage=None):
+    """One chat completion with exponential backoff on retryable errors."""
+    for attempt in range(MAX_RETRY_ATTEMPTS):
+        try:
+            response = client.chat.completions.create(
+                model=FOCUS_GROUP_MODEL,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                timeout=60,
+            )
+            if usage is not None:
+                usage.add(response.usage)
+            return (response.choices[0].message.content or "").strip(), response.usage
+        except Exception as e:
+            if attempt == MAX_RETRY_ATTEMPTS - 1 or not is_retryable(e):
+                raise
+            logging.warning(f"Focus group call failed (attempt {attempt + 1}): {e}")
+            time.sleep(backoff_delay(attempt))
+
+
+def _format_turns(turns):
+    return "\n".join(f"{t['name']}: {t['text']}" for t in turns)
+
+
+def _discussion_context(topic, summary, last_round):
+    """Bounded context: rolling summary of older rounds plus the previous round verbatim."""
+    parts = [f"Topic: {topic}"]
+    if summary:
+        parts.append(f"Summary of the discussion so far:\n{summary}")
+    if last_round:
+        parts.append(f"What was just said:\n{_format_turns(last_round)}")
+    else:
+        parts.append("The discussion is starting. Give your first reaction.")
+    parts.append("Your reply (a few sentences, speak as yourself):")
+    return "\n\n".join(parts)
+
+
+def _persona_turn(role, context, usage=None):
+    text, _ = _complete(
+        persona_messages(role, FOCUS_GROUP_INSTRUCTIONS, context),
+        max_tokens=FOCUS_GROUP_REPLY_TOKENS,
+        usage=usage,
+    )
+    return {"persona_id": role.get("id"), "name": role.get("name"), "text": text}
+
+
+def _fold_summary(topic, summary, round_turns, usage=None):
+    """Fold one round into the rolling summary (deterministic, cheap)."""
+    if not round_turns:
+        return summary
+    content = (
+        f"Topic: {topic}\n\nRunning summary:\n{summary or '(empty)'}\n\n"
+        f"New round:\n{_format_turns(round_turns)}"
+    )
+    text, _ = _complete(
+        [{"role": "system", "content": SUMMARY_INSTRUCTIONS}, {"role": "user", "content": content}],
+        max_tokens=FOCUS_GROUP_SUMMARY_TOKENS,
+        temperature=0,
+        usage=usage,
+    )
+    return text or summary
+
+
+def run_focus_group(population_name, topic, k=5, rounds=3, concurrency=FOCUS_GROUP_CONCURRENCY, on_round=None):
+    """
+    Run a multi-round discussion among k random personas of a population.
+
+    Every round all personas reply concurrently to the same context (rolling
+    summary + previous round verbatim), so the prompt stays bounded however many
+    rounds run. Folding the previous round into the summary happens in parallel
+    with the next round's replies. The transcript is saved to `discussions`
+    after every round. Returns (discussion_id, discussion_data), or (None, None)
+    if the population has no personas.
+    """
+    k = max(1, min(k, FOCUS_GROUP_MAX_PERSONAS))
+    rounds = max(1, min(rounds, FOCUS_GROUP_MAX_ROUNDS))
+    personas = sample_personas(population_name, k)
+    if not personas:
+        return None, None
+
+    usage = PromptUsage()
+    discussion_data = {
+        "topic": topic,
+        "status": "running",
+        "participants": [{"persona_id": p["id"], "name": p["name"]} for p in personas],
+        "rounds": [],
+        "summary": "",
+    }
+    discussion_id = save_discussion_data_to_db(population_name, discussion_data)
+
+    summary, last_round = "", []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(personas)) + 1)) as pool:
+            for round_no in range(1, rounds + 1):
+                context = _discussion_context(topic, summary, last_round)
+                fold = pool.submit(_fold_summary, topic, summary, last_round, usage) if last_round else None
+                futures = [pool.submit(_persona_turn, role, context, usage) for role in personas]
+                turns = []
+                for role, future in zip(personas, futures):
+                    try:
+                        turns.append(future.result())
+                    except Exception as e:
+                        logging.error(f"Focus group reply failed for {role.get('name')}: {e}")
+                if fold is not None:
+                    summary = fold.result()
+                last_round = turns
+
+                discussion_data["rounds"].append({"round": round_no, "turns": turns})
+                discussion_data["summary"] = summary
+                discussion_data["prompt_usage"] = usage.as_dict()
+                update_discussion_data_in_db(discussion_id, discussion_data)
+                if on_round:
+                    on_round(round_no, turns)
+
+        discussion_data["summary"] = _fold_summary(topic, summary, last_round, usage)
+        discussion_data["status"] = "done"
+    except Exception as e:
+        logging.error(f"Focus group {discussion_id} failed: {e}")
+        discussion_data["status"] = "failed"
+        discussion_data["error"] = str(e)
+    discussion_data["prompt_usage"] = usage.as_dict()
+    update_discussion_data_in_db(discussion_id, discussion_data)
+    return discussion_id, discussion_data
+
+
 @app.route('/get_reply', methods=['POST'])
 def get_reply():
     data = request.json
     population_name = data.get('population')  # Get the specified population
     previous_messages = data.get('previous_messages', [])
 
-    # Retrieve all personas by population from the database
-    populations = get_personas_by_population()
-    
+    # Pick one random persona of the population in SQL (no full persona scan)
+    sampled = sample_personas(population_name, k=1) if population_name else []
+
     # Ensure the specified population exists
-    if population_name not in populations:
+    if not sampled:
         return jsonify({"error": "Specified population not found"}), 404
 
-    # Select a random persona from the specified population group
-    role = random.choice(populations[population_name])
-
-    # Construct persona description for GPT prompt
-    role_description = (
-        f"Name: {role.get('name', 'Unknown')}, Age: {role.get('age', 'Unknown')}, Gender: {role.get('gender', 'Unknown')}, "
-        f"Orientation: {role.get('orientation', 'Unknown')}, Location: {role.get('location', 'Unknown')}, MBTI Type: {role.get('mbti_type', 'Unknown')}, "
-        f"Occupation: {role.get('occupation', 'Unknown')}, Education: {role.get('education', 'Unknown')}, Income Level: {role.get('income_level', 'Unknown')}, "
-        f"Financial Security: {role.get('financial_security', 'Unknown')}, Main Concern: {role.get('main_concern', 'Unknown')}, "
-        f"Source of Joy: {role.get('source_of_joy', 'Unknown')}, Social Ties: {role.get('social_ties', 'Unknown')}, "
-        f"Values and Beliefs: {role.get('values_and_beliefs', 'Unknown')}, Perspective on Change: {role.get('perspective_on_change', 'Unknown')}, "
-        f"Daily Routine: {role.get('daily_routine', 'Unknown')}"
+    role = sampled[0]
+
+    # Fit the history into the token budget: older turns folded into a summary.
+    # The client echoes summary / summarized back, so only new blocks are folded next time.
+    summary, recent, summarized = window_history(
+        client, previous_messages, int(data.get('token_budget', CONTEXT_TOKEN_BUDGET)),
+        summary=data.get('summary') or "", summarized=int(data.get('summarized') or 0),
     )
 
-    # Prepare the prompt for GPT
-    prompt = (
-        f"{role_description}\n"
-        "You are talking in a room with people you don't know. You discuss with a style that is typical to you.\n"
+    # Static prefix (instructions + stored persona description) first, discussion last
+    messages = persona_messages(
+        role,
+        FOCUS_GROUP_INSTRUCTIONS,
         "Recent discussion to which you reply to:\n"
-        + "\n".join(previous_messages[-5:])  # Only send the last 5 messages
-        + "\nYour reply:"
+        + render_history(summary, recent)
+        + "\nYour reply:",
     )
 
     try:
-        # Make the OpenAI API call
-        response = client.Completion.create(
-            model="gpt-4",
-            prompt=prompt,
-            max_tokens=50,
-            stop=["\n"]
-        )
-        reply = response.choices[0].text.strip()
-        return jsonify({"reply": reply, "persona_name": persona['name']})
+        reply, usage = _complete(messages, max_tokens=FOCUS_GROUP_REPLY_TOKENS)
+        return jsonify({
+            "reply": reply,
+            "persona_name": role['name'],
+            "cached_tokens": cached_tokens(usage),
+            "summary": summary,
+            "summarized": summarized,
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+@app.route('/focus_group', methods=['POST'])
+def start_focus_group():
+    data = request.json or {}
+    population_name = data.get('population')
+    topic = (data.get('topic') or "").strip()
+    if not population_name or not topic:
+        return jsonify({"error": "population and topic are required"}), 400
+
+    discussion_id, discussion_data = run_focus_group(
+        population_name,
+        topic,
+        k=int(data.get('personas', 5)),
+        rounds=int(data.get('rounds', 3)),
+    )
+    if discussion_id is None:
+        return jsonify({"error": "Specified population not found"}), 404
+    return jsonify({"discussion_id": discussion_id, **discussion_data})
+
+
+@app.route('/focus_group/<int:discussion_id>', methods=['GET'])
+def get_focus_group(discussion_id):
+    discussion_data = get_discussion_data_from_db(discussion_id)
+    if discussion_data is None:
+        return jsonify({"error": "Discussion not found"}), 404
+    return jsonify({"discussion_id": discussion_id, **discussion_data})
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python -m models.focus_group <population> <topic> [personas] [rounds]")
+        sys.exit(1)
+
+    population_name = sys.argv[1]
+    topic = sys.argv[2]
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    rounds = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+
+    def show(round_no, turns):
+        print(f"\n--- Round {round_no} ---")
+        for turn in turns:
+            print(f"{turn['name']}: {turn['text']}")
+
+    discussion_id, discussion_data = run_focus_group(population_name, topic, k, rounds, on_round=show)
+    if discussion_id is None:
+        print(f"No personas found for population: {population_name}")
+        return
+    print(f"\nSummary:\n{discussion_data['summary']}")
+    print(f"(discussions id {discussion_id}, status {discussion_data['status']})")
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    if len(sys.argv) > 1:
+        main()
+    else:
+        app.run(debug=True)
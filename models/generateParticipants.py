@@ -1,11 +1,17 @@
 #generateParticipants.py
 import os
+import sys
+import time
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from openai import OpenAI
 from pydantic import BaseModel, Field
 from typing import List, Optional, Tuple, Dict
 
+from .llm_cache import cached_parse
+from .rate_limit import TokenBucket, is_retryable, backoff_delay
+
 # Load environment variables
 load_dotenv()
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -17,6 +23,9 @@ client = OpenAI(api_key=OPENAI_API_KEY)
 MAX_ROLES = int(os.getenv('NUM_ROLES', 10))
 MAX_RETRY_ATTEMPTS = 3
 MODEL = "gpt-4o-mini"
+PERSONA_CONCURRENCY = int(os.getenv('PERSONA_CONCURRENCY', 8))
+PERSONA_RPM = float(os.getenv('PERSONA_RPM', 300))  # requests per minute to MODEL
+PERSONA_BATCH_SIZE = int(os.getenv('PERSONA_BATCH_SIZE', 50))
 
 class GenderWeights(BaseModel):
     man: float
@@ -91,20 +100,17 @@ def get_gender_attributes(population_name, location):
     
     for _ in range(MAX_RETRY_ATTEMPTS):
         try:
-            completion = client.beta.chat.completions.parse(
+            return cached_parse(
+                client,
+                GenderWeights,  # Use Pydantic model for structured output
                 model=MODEL,
                 messages=messages,
-                response_format=GenderWeights  # Use Pydantic model for structured output
             )
-            # Extract and return the parsed persona
-            #print(completion.choices[0].message.parsed)
-            return completion.choices[0].message.parsed
         
         except Exception as e:
             print(f"Error generating bg attributes: {e}")
     
-            return GenderWeights(
-                gender_weights={"man": 0.49, "woman": 0.49, "other": 0.02})  
+            return GenderWeights(man=0.49, woman=0.49, other=0.02)
 
 
 def get_age_attributes(population_name, location):
@@ -118,20 +124,16 @@ def get_age_attributes(population_name, location):
     
     for _ in range(MAX_RETRY_ATTEMPTS):
         try:
-            completion = client.beta.chat.completions.parse(
+            return cached_parse(
+                client,
+                AgeAttributes,  # Use Pydantic model for structured output
                 model=MODEL,
                 messages=messages,
-                response_format=AgeAttributes  # Use Pydantic model for structured output
             )
-            # Extract and return the parsed persona
-            return completion.choices[0].message.parsed
-        
         except Exception as e:
             print(f"Error generating bg attributes: {e}")
     
-            return AgeAttributes(
-                age_range=(15, 75),  # Middle age, suitable for general contexts
-                )  
+            return AgeAttributes(age_low=15, age_high=75)  # suitable for general contexts
 
 def generate_role(population_name, location, age_attributes=None, gender_weights=None, unique_names=None):
 
@@ -183,21 +185,80 @@ def openai_generate_persona(population_name, age, gender, orientation, location,
         {"role": "user", "content": prompt}
     ]
     
-    for _ in range(MAX_RETRY_ATTEMPTS):
+    # No fallback persona: the last error propagates and generate_population skips this one
+    for attempt in range(MAX_RETRY_ATTEMPTS):
         try:
-            completion = client.beta.chat.completions.parse(
+            # Extract the parsed persona
+            persona = cached_parse(
+                client,
+                Persona,  # Use Pydantic model for structured output
                 model=MODEL,
                 messages=messages,
                 temperature=0.9,
-                response_format=Persona  # Use Pydantic model for structured output
             )
-            # Extract and return the parsed persona
-            return completion.choices[0].message.parsed
         except Exception as e:
-            print(f"Error generating persona: {e}")
-    
-    # Return a fallback persona if GPT fails
-    return Persona(name="Fallback Persona", age=age, gender=gender, orientation=orientation)
+            if attempt == MAX_RETRY_ATTEMPTS - 1 or not is_retryable(e):
+                raise
+            print(f"Error generating persona (attempt {attempt + 1}): {e}")
+            time.sleep(backoff_delay(attempt))
+            continue
+        if persona is None:
+            raise ValueError("Model returned no persona (refusal)")
+        return persona
+
+
+def generate_population(population_name, location, n,
+                        concurrency=PERSONA_CONCURRENCY,
+                        requests_per_minute=PERSONA_RPM,
+                        batch_size=PERSONA_BATCH_SIZE):
+    """
+    Build a population of n personas and store it in the DB.
+
+    Age and gender attributes are fetched once, in parallel. Personas are then
+    generated concurrently (at most `concurrency` in flight, paced to
+    `requests_per_minute`) and written in batches of `batch_size`. Resumable:
+    personas already stored for the population count towards n, so rerunning
+    after a crash only generates the missing ones.
+    Returns the number of personas stored by this call.
+    """
+    # Lazy import: db_utils imports Persona from this module
+    from .db_utils import bulk_insert_personas, count_personas
+
+    todo = n - count_personas(population_name)
+    if todo <= 0:
+        print(f"Population '{population_name}' already has {n} personas.")
+        return 0
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        age_future = pool.submit(get_age_attributes, population_name, location)
+        gender_future = pool.submit(get_gender_attributes, population_name, location)
+        age_attributes, gender_weights = age_future.result(), gender_future.result()
+
+    bucket = TokenBucket(requests_per_minute / 60.0, capacity=concurrency)
+
+    def one_persona():
+        bucket.acquire()
+        return generate_role(population_name, location, age_attributes, gender_weights)
+
+    saved, batch = 0, []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(one_persona) for _ in range(todo)]
+        for future in as_completed(futures):
+            try:
+                batch.append(future.result())
+            except Exception as e:
+                # Skipped personas are generated on the next (resumed) run
+                print(f"Error generating persona: {e}")
+                continue
+            if len(batch) >= batch_size:
+                bulk_insert_personas(population_name, batch, location=location)
+                saved += len(batch)
+                batch = []
+                print(f"Population '{population_name}': {n - todo + saved}/{n} personas stored.")
+        if batch:
+            bulk_insert_personas(population_name, batch, location=location)
+            saved += len(batch)
+    return saved
 
 
 def realistic_age_distribution():
@@ -216,3 +277,18 @@ def generate_age():
     return realistic_age_distribution()
 
 
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python -m models.generateParticipants <population> <location> [personas]")
+        sys.exit(1)
+
+    population_name = sys.argv[1]
+    location = sys.argv[2]
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else MAX_ROLES
+
+    saved = generate_population(population_name, location, n)
+    print(f"Population '{population_name}': {saved} new personas stored.")
+
+
+if __name__ == '__main__':
+    main()
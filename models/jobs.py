@@ -0,0 +1,108 @@
+#jobs.py
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from .db_utils import (
+    create_run_job, update_run_job, start_run_job, touch_run_jobs, fail_stale_run_job,
+    get_run_job, commit_unit_of_work,
+)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "30"))
+# A queued/running job without a heartbeat this long lost its process (restart, deploy, recycled worker)
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "300"))
+
+
+class StageRejected(Exception):
+    """Raised by a stage to stop the job without treating it as a failure (e.g. quality gate)."""
+
+
+class JobRunner:
+    """
+    In-process background queue for multi-stage run jobs.
+
+    A job is an ordered list of (stage_name, fn) pairs; each fn is called as
+    fn(ctx, progress) where ctx is a dict shared between stages and
+    progress(done, total) records per-stage progress. Status lives in the
+    run_jobs table so any gunicorn worker can answer /runs/<id>/status.
+    While a job is queued or running here, a heartbeat thread keeps its
+    updated_at fresh; see get_current_run_job for the other side.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="run-job")
+        self._active = set()
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+    def submit(self, run_id: str, stages: list, ctx: dict | None = None):
+        create_run_job(run_id, [name for name, _ in stages])
+        # The job thread has its own sessions: make the run visible to it first
+        commit_unit_of_work()
+        with self._lock:
+            self._active.add(run_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="run-job-heartbeat", daemon=True)
+                self._heartbeat.start()
+        return self._pool.submit(self._run, run_id, stages, dict(ctx or {}))
+
+    def _beat(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_SECONDS)
+            with self._lock:
+                active = list(self._active)
+            try:
+                touch_run_jobs(active)
+            except Exception:
+                logging.exception("Run job heartbeat failed")
+
+    def _run(self, run_id: str, stages: list, ctx: dict):
+        try:
+            self._run_stages(run_id, stages, ctx)
+        finally:
+            with self._lock:
+                self._active.discard(run_id)
+
+    def _run_stages(self, run_id: str, stages: list, ctx: dict):
+        if not start_run_job(run_id):
+            logging.warning(f"Run job {run_id} is no longer queued; skipping")
+            return
+        for name, fn in stages:
+            update_run_job(run_id, stage=name, stage_status="running")
+
+            def progress(done, total, _stage=name):
+                update_run_job(run_id, stage=_stage, done=done, total=total)
+
+            try:
+                fn(ctx, progress)
+            except StageRejected as e:
+                update_run_job(run_id, status="rejected", stage=name, stage_status="rejected", error=str(e))
+                return
+            except Exception as e:
+                logging.exception(f"Run job {run_id} failed in stage {name}")
+                update_run_job(run_id, status="failed", stage=name, stage_status="failed", error=str(e))
+                return
+            update_run_job(run_id, stage=name, stage_status="done")
+        update_run_job(run_id, status="done")
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+def get_current_run_job(run_id: str, stale_after_seconds: float = JOB_STALE_SECONDS):
+    """
+    get_run_job, but a queued/running job whose heartbeat stopped (its process
+    died) is marked failed first, so callers never wait on it forever.
+    """
+    job = get_run_job(run_id)
+    if not job or job["status"] not in ("queued", "running") or not job["updated_at"]:
+        return job
+    age = (datetime.utcnow() - datetime.fromisoformat(job["updated_at"])).total_seconds()
+    if age > stale_after_seconds and fail_stale_run_job(run_id, stale_after_seconds):
+        logging.warning(f"Run job {run_id} had no heartbeat for {age:.0f}s; marked failed")
+        job = get_run_job(run_id)
+    return job
@@ -0,0 +1,238 @@
+#llm_cache.py
+"""
+Content-addressed cache for OpenAI chat completions.
+
+Two tiers:
+  - in-process LRU (per gunicorn worker / cron process)
+  - durable llm_cache table shared by all processes (db_utils engine and pool;
+    the table is created by migration 006)
+
+Only deterministic calls (temperature 0) are cached unless LLM_CACHE_ALL=1.
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import IntegrityError
+from openai.types.chat import ChatCompletion
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_ALL = os.environ.get("LLM_CACHE_ALL", "0") == "1"
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+LLM_CACHE_MAX_ITEMS = int(os.environ.get("LLM_CACHE_MAX_ITEMS", "2000"))     # LRU tier
+LLM_CACHE_MAX_ROWS = int(os.environ.get("LLM_CACHE_MAX_ROWS", "100000"))     # durable tier
+# Parameters that cannot change the model output. Everything else is part of the key.
+UNKEYED_PARAMS = ("timeout", "user")
+
+
+def _canonical(value):
+    """JSON fallback for non-JSON parameters (pydantic response formats, ...)."""
+    if isinstance(value, type) and hasattr(value, "model_json_schema"):
+        return {"name": value.__name__, "schema": value.model_json_schema()}
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    return str(value)
+
+
+def cache_key(params: dict, response_format=None) -> str:
+    """sha256 over the canonical JSON of every request parameter except UNKEYED_PARAMS."""
+    payload = {k: v for k, v in params.items() if k not in UNKEYED_PARAMS}
+    if response_format is not None:
+        payload["response_format"] = response_format
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=_canonical)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(params: dict) -> bool:
+    if not LLM_CACHE_ENABLED:
+        return False
+    # OpenAI defaults to temperature 1 when it is not given
+    return LLM_CACHE_ALL or params.get("temperature", 1) == 0
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with per-entry expiry."""
+
+    def __init__(self, max_items: int = LLM_CACHE_MAX_ITEMS, ttl: float = LLM_CACHE_TTL):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLCache:
+    """
+    Durable tier: one row per key with a JSON text value and an expiry timestamp.
+    Uses the db_utils engine (same pool) but its own short transactions, so a
+    cache write never joins or breaks a request's unit of work.
+    """
+
+    def __init__(self, ttl: float = LLM_CACHE_TTL, max_rows: int = LLM_CACHE_MAX_ROWS):
+        from .db_utils import engine, LLMCacheEntry  # lazy: needs DATABASE_URL
+
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.engine = engine
+        self.table = LLMCacheEntry.__table__
+
+    def get(self, key):
+        t = self.table
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(t.c.value).where(t.c.key == key, t.c.expires_at >= time.time())
+            ).first()
+        return json.loads(row.value) if row else None
+
+    def set(self, key, value):
+        t = self.table
+        now = time.time()
+        blob = json.dumps(value, ensure_ascii=False)
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(delete(t).where(t.c.key == key))
+                conn.execute(t.insert().values(key=key, value=blob, created_at=now, expires_at=now + self.ttl))
+        except IntegrityError:
+            # Another worker stored the same key in between; the value is identical
+            pass
+        # Amortize eviction over writes instead of running it on every insert
+        if random.random() < 0.01:
+            self.evict()
+
+    def evict(self):
+        """Drop expired rows and trim the table to max_rows newest entries."""
+        t = self.table
+        with self.engine.begin() as conn:
+            conn.execute(delete(t).where(t.c.expires_at < time.time()))
+            total = conn.execute(select(func.count()).select_from(t)).scalar_one()
+            if total > self.max_rows:
+                cutoff = conn.execute(
+                    select(t.c.created_at).order_by(t.c.created_at.desc())
+                    .offset(self.max_rows).limit(1)
+                ).scalar()
+                if cutoff is not None:
+                    conn.execute(delete(t).where(t.c.created_at <= cutoff))
+
+
+class LLMCache:
+    """LRU in front of an optional durable tier. Durable failures never break a call."""
+
+    def __init__(self, memory: LRUCache | None = None, durable=None):
+        self.memory = memory or LRUCache()
+        self.durable = durable
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.durable is not None:
+            try:
+                value = self.durable.get(key)
+            except Exception as e:
+                logging.warning(f"LLM cache read failed: {e}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.durable is not None:
+            try:
+                self.durable.set(key, value)
+            except Exception as e:
+                logging.warning(f"LLM cache write failed: {e}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    """Process-wide cache, created lazily so importing this module stays cheap."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    durable = SQLCache()
+                except Exception as e:
+                    logging.warning(f"LLM cache: durable tier disabled ({e})")
+                    durable = None
+                _cache = LLMCache(durable=durable)
+    return _cache
+
+
+def set_cache(cache: LLMCache | None):
+    """Swap the process-wide cache (e.g. memory-only in scripts)."""
+    global _cache
+    _cache = cache
+
+
+def cached_chat_completion(client, on_usage=None, **params) -> ChatCompletion:
+    """
+    Drop-in for client.chat.completions.create(**params) that consults the cache.
+    on_usage(completion.usage), if given, is called only for responses that came
+    from the API; cache replays carry the original call's usage and are skipped.
+    """
+    if not is_cacheable(params):
+        completion = client.chat.completions.create(**params)
+    else:
+        cache = get_cache()
+        key = cache_key(params)
+        hit = cache.get(key)
+        if hit is not None:
+            return ChatCompletion.model_validate(hit)
+        completion = client.chat.completions.create(**params)
+        cache.set(key, completion.model_dump(mode="json"))
+    if on_usage is not None:
+        on_usage(completion.usage)
+    return completion
+
+
+def cached_parse(client, response_format, **params):
+    """
+    Like client.beta.chat.completions.parse(...), but returns only the parsed
+    pydantic object (choices[0].message.parsed), which is what gets cached.
+    """
+    if not is_cacheable(params):
+        completion = client.beta.chat.completions.parse(response_format=response_format, **params)
+        return completion.choices[0].message.parsed
+    cache = get_cache()
+    key = cache_key(params, response_format)
+    hit = cache.get(key)
+    if hit is not None:
+        return response_format.model_validate(hit)
+    completion = client.beta.chat.completions.parse(response_format=response_format, **params)
+    parsed = completion.choices[0].message.parsed
+    if parsed is not None:
+        cache.set(key, parsed.model_dump(mode="json"))
+    return parsed
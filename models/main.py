@@ -9,6 +9,18 @@ import json
 from datetime import datetime, timedelta
 import time
 import re
+import math
+import urllib.request
+import urllib.error
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from .llm_cache import cached_chat_completion
+    from .processed_store import ProcessedStore, entry_timestamp
+except ImportError:  # run as a script: python models/main.py
+    from llm_cache import cached_chat_completion
+    from processed_store import ProcessedStore, entry_timestamp
 
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 
@@ -24,8 +36,15 @@ RSS_FEED_URLS = [
     "https://feeds.yle.fi/uutiset/v1/recent.rss?publisherIds=YLE_UUTISET&concepts=18-147345",
     "https://www.hs.fi/rss/tuoreimmat.xml"
 ]
+# Pilkuilla eroteltu lista ohittaa oletukset (esim. paikallinen testipalvelin)
+if os.environ.get('RSS_FEED_URLS'):
+    RSS_FEED_URLS = [u.strip() for u in os.environ['RSS_FEED_URLS'].split(',') if u.strip()]
 
-PROCESSED_FILE = "processed_links.txt"
+PROCESSED_FILE = "processed_links.txt"  # legacy; imported once into ProcessedStore
+FEED_CURSOR_SLACK = float(os.environ.get('FEED_CURSOR_SLACK', 15 * 60))  # seconds of late/backdated items tolerated
+FEED_STATE_FILE = "feed_state.json"  # ETag / Last-Modified per feed
+FEED_TIMEOUT = float(os.environ.get('FEED_TIMEOUT', 10))  # seconds per feed request
+FEED_WORKERS = int(os.environ.get('FEED_WORKERS', 6))
 
 SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
@@ -47,7 +66,8 @@ def generate_gpt_response(identity, prompt, model):
     ]
     
     try:
-        completion = client.chat.completions.create(
+        completion = cached_chat_completion(
+            client,
             model=model,
             messages=messages,
             max_tokens=14000,
@@ -137,157 +157,308 @@ def load_tweet_sample(file_path):
         print(f"Virhe: Tiedostoa {file_path} ei löydy.")
         return ""
 
-def parse_all_feeds():
+def load_feed_state(file_path):
+    """Lue syötteiden ETag/Last-Modified-validaattorit: {url: {"etag": ..., "modified": ...}}."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_feed_state(file_path, state):
+    """Tallenna validaattorit atomisesti (ei puolikasta tiedostoa rinnakkaisilla ajoilla)."""
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, file_path)
+
+def fetch_feed(rss_url, validators=None, timeout=FEED_TIMEOUT):
     """
-    Pulls articles from all RSS_FEED_URLS. Returns a sorted list of feed entries (newest first).
+    Conditional GET for one feed.
+    Returns (entries, validators): entries is [] on 304 Not Modified and None on failure.
     """
+    validators = validators or {}
+    headers = {"User-Agent": "Mozilla/5.0 (compatible; hoksnokka-rss/1.0)"}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("modified"):
+        headers["If-Modified-Since"] = validators["modified"]
+
+    try:
+        request = urllib.request.Request(rss_url, headers=headers)
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            new_validators = {
+                "etag": response.headers.get("ETag"),
+                "modified": response.headers.get("Last-Modified"),
+            }
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return [], validators
+        print(f"RSS-feedin nouto epäonnistui: {rss_url} (HTTP {e.code})")
+        return None, validators
+    except Exception as e:
+        print(f"RSS-feedin nouto epäonnistui: {rss_url} ({e})")
+        return None, validators
+
+    feed = feedparser.parse(body)
+    if feed.bozo:
+        print(f"RSS-feedin nouto epäonnistui: {rss_url}")
+        return None, validators
+    return feed.entries, {k: v for k, v in new_validators.items() if v}
+
+def parse_all_feeds(feed_state=None):
+    """
+    Pulls articles from all RSS_FEED_URLS concurrently. Returns a sorted list of feed entries (newest first).
+    If feed_state ({url: validators}) is given, conditional requests are sent and the
+    dict is updated in place with fresh validators; unchanged feeds contribute no entries.
+    """
+    if feed_state is None:
+        feed_state = {}
     all_entries = []
-    for rss_url in RSS_FEED_URLS:
-        feed = feedparser.parse(rss_url)
-        if feed.bozo:
-            print(f"RSS-feedin nouto epäonnistui: {rss_url}")
-            continue
-        all_entries.extend(feed.entries)
+    if not RSS_FEED_URLS:
+        return all_entries
+    with ThreadPoolExecutor(max_workers=min(FEED_WORKERS, len(RSS_FEED_URLS))) as pool:
+        futures = [
+            (rss_url, pool.submit(fetch_feed, rss_url, feed_state.get(rss_url)))
+            for rss_url in RSS_FEED_URLS
+        ]
+        for rss_url, future in futures:  # keep feed order deterministic
+            entries, validators = future.result()
+            if entries is None:
+                continue
+            if validators:
+                feed_state[rss_url] = validators
+            for entry in entries:
+                entry["feed_url"] = rss_url
+            all_entries.extend(entries)
     all_entries.sort(key=lambda entry: entry.get("published_parsed", 0), reverse=True)
     return all_entries
 
-def process_politician(
-    politician_file, 
-    recipient_addresses, 
-    old_processed_links, 
-    all_entries, 
-    tweet_sample_file,    # NEW
-    press_sample_file     # NEW
-):
-    """
-    - Skips any article in 'old_processed_links' (from prior runs).
-    - Checks new articles with GPT. Possibly sends an email.
-    - Returns the set of links that were processed for this politician (in this run).
-    """
+def index_feed_entries(entries):
+    """Feed the shared news index used by the app's media snapshot (failures are not fatal)."""
+    try:
+        # Needs the package and DATABASE_URL (python -m models.main); skipped otherwise
+        from .news_index import add_feed_entries, purge_news_index
+        added = add_feed_entries(entries)
+        purge_news_index()
+        print(f"Uutisindeksiin lisätty {added} uutta artikkelia")
+    except Exception as e:
+        print(f"Uutisindeksin päivitys epäonnistui: {e}")
 
-    newly_processed = set()
+# Pipeline concurrency limits (per stage)
+RELEVANCE_WORKERS = int(os.environ.get('RELEVANCE_WORKERS', 8))  # FASTMODEL relevance checks
+DRAFT_WORKERS = int(os.environ.get('DRAFT_WORKERS', 4))          # GOODMODEL press release / tweet
+SELECT_WORKERS = int(os.environ.get('SELECT_WORKERS', 2))        # final pick + email per politician
 
-    # Load politician JSON
+SKIP_SUBSTRINGS = ["/maailma/", "/urheilu/", "/taide/", "/muistot/"]
+
+def load_politician(politician_file, recipient_addresses, tweet_sample_file, press_sample_file):
+    """Load one subscriber's profile and samples once for the whole run."""
     with open(politician_file, "r", encoding="utf-8") as f:
         profile_text = json.load(f)
-
-    # Load the tweet sample and press release sample for THIS politician
-    tweet_example = load_tweet_sample(tweet_sample_file)       # CHANGED
-    press_release_example = load_identity_template(press_sample_file)  # CHANGED
-
-    # We'll skip certain substrings
-    SKIP_SUBSTRINGS = ["/maailma/", "/urheilu/", "/taide/", "/muistot/"]
+    return {
+        "file": politician_file,
+        "recipients": recipient_addresses,
+        "profile_text": profile_text,
+        "tweet_example": load_tweet_sample(tweet_sample_file),
+        "press_release_example": load_identity_template(press_sample_file),
+    }
+
+def select_new_entries(all_entries, old_processed_links, cursors=None):
+    """
+    Shared article stream: entries not processed in a prior run, not on skipped
+    paths and published within the last hour. Computed once for all politicians.
+    old_processed_links is a set of links or a ProcessedStore; cursors is an
+    optional {feed_url: last_published_epoch} used to drop old entries first.
+    """
     one_hour_ago = time.mktime((datetime.now() - timedelta(hours=1)).timetuple())
-
-    potential_drafts = []
-
+    cursors = cursors or {}
+    selected = []
     for entry in all_entries:
         link = entry.link
-        title = entry.title
-        summary = getattr(entry, 'summary', '')
-
+        # Skip anything older than what this feed already delivered (cheap, no lookup)
+        cursor = cursors.get(entry.get("feed_url"))
+        published_ts = entry_timestamp(entry)
+        if cursor is not None and published_ts is not None and published_ts < cursor - FEED_CURSOR_SLACK:
+            continue
         # Skip if processed in a previous run
         if link in old_processed_links:
             continue
-        
         # Skip undesired paths
         if any(skip in link for skip in SKIP_SUBSTRINGS):
             continue
-
         # Skip if older than 1 hour
         published_time = entry.get("published_parsed")
         if published_time and time.mktime(published_time) < one_hour_ago:
             continue
+        selected.append(entry)
+    return selected
+
+# Local pre-screen: only the best-matching (politician, article) pairs get a FASTMODEL check
+PRESCREEN_ENABLED = os.environ.get('PRESCREEN_ENABLED', '1') != '0'
+PRESCREEN_TOP_K = int(os.environ.get('PRESCREEN_TOP_K', 2))              # politicians per article
+PRESCREEN_MIN_SCORE = float(os.environ.get('PRESCREEN_MIN_SCORE', 0.05))  # cosine similarity
+PRESCREEN_STEM = 6  # crude prefix stemming; Finnish inflects word endings heavily
+
+_STOPWORDS = set((
+    "the and for with this that from are was were have has not you your our their "
+    "että joka jotka sekä mutta kuin myös tämä tämän nämä niin ovat olla oli ollut ole "
+    "sen sitä hän he me te ne kun jos vain ei eikä voi mukaan jälkeen vuoden vuonna"
+).split())
+
+def _flatten_text(obj):
+    """All string values of a (nested) profile JSON as one text."""
+    if isinstance(obj, dict):
+        return " ".join(_flatten_text(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return " ".join(_flatten_text(v) for v in obj)
+    return str(obj) if obj is not None else ""
+
+def _terms(text):
+    words = re.findall(r"[^\W\d_]{3,}", (text or "").lower())
+    return [w[:PRESCREEN_STEM] for w in words if w not in _STOPWORDS]
+
+def _tfidf_vectors(term_lists, idf):
+    vectors = []
+    for terms in term_lists:
+        counts = Counter(t for t in terms if t in idf)
+        vec = {t: (1 + math.log(c)) * idf[t] for t, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+        vectors.append({t: v / norm for t, v in vec.items()})
+    return vectors
+
+def prescreen_pairs(politicians, entries, top_k=PRESCREEN_TOP_K, min_score=PRESCREEN_MIN_SCORE):
+    """
+    Score every article once against all politician profiles with a local
+    TF-IDF cosine similarity and keep the top_k politicians per article whose
+    score is at least min_score. Returns [(politician_index, entry), ...].
+    """
+    profile_terms = [_terms(_flatten_text(p["profile_text"])) for p in politicians]
+    article_terms = [_terms(f"{e.title} {getattr(e, 'summary', '')}") for e in entries]
+
+    docs = profile_terms + article_terms
+    df = Counter(t for terms in docs for t in set(terms))
+    idf = {t: math.log((1 + len(docs)) / (1 + n)) + 1 for t, n in df.items()}
+    profile_vecs = _tfidf_vectors(profile_terms, idf)
+    article_vecs = _tfidf_vectors(article_terms, idf)
+
+    pairs = []
+    for entry, avec in zip(entries, article_vecs):
+        scored = []
+        for pi, pvec in enumerate(profile_vecs):
+            score = sum(w * pvec.get(t, 0.0) for t, w in avec.items())
+            if score >= min_score:
+                scored.append((score, pi))
+        scored.sort(reverse=True)
+        pairs.extend((pi, entry) for _, pi in scored[:top_k])
+    print(f"Pre-screen: {len(pairs)} / {len(entries) * len(politicians)} pairs go to relevance check.")
+    return pairs
+
+def check_relevance(politician, entry):
+    """FASTMODEL check. Returns the Finnish explanation if RELEVANT, else None."""
+    title = entry.title
+    summary = getattr(entry, 'summary', '')
+    check_identity = (
+         "You are a highly selective media assistant to a politician. "
+        "Your job is to identify only the most extraordinary news opportunities for the politician, "
+        "whose opinions are provided to you, to make a press release. "
+        "You reply with the word INAPPLICABLE unless the news article is an outstanding opportunity for this particular politician "
+        "and potential press release from the politician to this piece of news directly aligns with the politician's primary policy focus and is likely to generate "
+        "significant positive media attention and public engagement. "
+        "If such an rare opportunity exists, you reply RELEVANT [explanation in Finnish]."
+    )
+    check_prompt = f"""
+    Politician profile:
+    {politician["profile_text"]}
+
+    News article:
+    Title: {title}
+    Summary: {summary}
+
+        "Evaluate the article's relevance to the politician's core priorities and strategic goals 
+        on a scale of 1 to 5, where 1 is irrelevant, 2 is moderately relevant, 3 is relevant, 4 is very relevant and 5 is an extraordinary 
+        opportunity with extraordinarily high public and media impact. If the score is 1–4, reply INAPPLICABLE. 
+        Only reply RELEVANT with a concise justification in Finnish if the score is 5 out of 5, 
+        representing a news opportunity that is unmissable and aligns directly with the politician's strategic interests.".
+    """
 
-        # GPT check
-        check_identity = (
-             "You are a highly selective media assistant to a politician. "
-            "Your job is to identify only the most extraordinary news opportunities for the politician, "
-            "whose opinions are provided to you, to make a press release. "
-            "You reply with the word INAPPLICABLE unless the news article is an outstanding opportunity for this particular politician "
-            "and potential press release from the politician to this piece of news directly aligns with the politician's primary policy focus and is likely to generate "
-            "significant positive media attention and public engagement. "
-            "If such an rare opportunity exists, you reply RELEVANT [explanation in Finnish]."
-        )
-        check_prompt = f"""
-        Politician profile:
-        {profile_text}
-
-        News article:
-        Title: {title}
-        Summary: {summary}
-
-            "Evaluate the article's relevance to the politician's core priorities and strategic goals 
-            on a scale of 1 to 5, where 1 is irrelevant, 2 is moderately relevant, 3 is relevant, 4 is very relevant and 5 is an extraordinary 
-            opportunity with extraordinarily high public and media impact. If the score is 1–4, reply INAPPLICABLE. 
-            Only reply RELEVANT with a concise justification in Finnish if the score is 5 out of 5, 
-            representing a news opportunity that is unmissable and aligns directly with the politician's strategic interests.".
-        """
-
-        gpt_check_response = generate_gpt_response(check_identity, check_prompt, FASTMODEL)
-        print("\nCheck response:\n", gpt_check_response, "\n")
-
-        # Mark link processed in THIS run, so it won't be shown next run
-        newly_processed.add(link)
-
-        # Check if GPT says RELEVANT
-        if gpt_check_response and "RELEVANT" in gpt_check_response.upper():
-            match = re.search(r'\bRELEVANT\b\s*(.*)', gpt_check_response, re.IGNORECASE | re.DOTALL)
-            explanation = match.group(1).strip() if match else "Ei selitystä."
-
-            # Create Press Release
-            press_identity = (
-                f"You are media assistant to a politician. "
-                f"You create press releases in Finnish that are structured similarly to these samples: \n{press_release_example}."
-            )
-            press_prompt = f"""
-            You write this press release because {explanation}.
-            Politician profile:
-            {profile_text}
-
-            News article:
-            Title: {title}
-            Summary: {summary}
-
-            Create a press release in Finnish about the politician’s additional comments 
-            on this news item. Keep it fairly short but newsworthy.
-            """
-            press_release = generate_gpt_response(press_identity, press_prompt, GOODMODEL)
-
-            # Create Tweet
-            tweet_identity = (
-                f"You are media assistant to a politician. You write tweets for them."
-                f"You create max 260 character tweets in Finnish that are structured similarly to: \n{tweet_example}"
-            )
-            tweet_prompt = f"""
-            You write this tweet because {explanation}.
-            \n\nFollowing a news article '{title}' at {link}, create a tweet the politician can use themself. It needs to focus on one thing and be very concrete, for example a novel policy proposal."
-            """
-            tweet = generate_gpt_response(tweet_identity, tweet_prompt, GOODMODEL)
-
-            if press_release:
-                subject = f"Uusi HOKSNOKKA-tiedote: {title}"
-                body = (
-                    f"Otsikko: {title}\n"
-                    f"Linkki: {link}\n\n"
-                    f"Miksi nyt kannattaa reagoida: \n{explanation}\n\n"
-                    "- - - - - 8< - - -\n\n"
-                    f"Hoksnokka-pressitiedote:\n{press_release}\n"
-                    "- - - - - 8< - - -\n\n"
-                    f"Some-viesti:\n{tweet}\n\n"
-                )
-                potential_drafts.append({
-                    "subject": subject,
-                    "body": body,
-                    "explanation": explanation,
-                    "link": link,
-                    "title": title
-                })
+    gpt_check_response = generate_gpt_response(check_identity, check_prompt, FASTMODEL)
+    print("\nCheck response:\n", gpt_check_response, "\n")
+
+    # Check if GPT says RELEVANT
+    if gpt_check_response and "RELEVANT" in gpt_check_response.upper():
+        match = re.search(r'\bRELEVANT\b\s*(.*)', gpt_check_response, re.IGNORECASE | re.DOTALL)
+        return match.group(1).strip() if match else "Ei selitystä."
+    return None
+
+def write_press_release(politician, entry, explanation):
+    press_identity = (
+        f"You are media assistant to a politician. "
+        f"You create press releases in Finnish that are structured similarly to these samples: \n{politician['press_release_example']}."
+    )
+    press_prompt = f"""
+    You write this press release because {explanation}.
+    Politician profile:
+    {politician["profile_text"]}
+
+    News article:
+    Title: {entry.title}
+    Summary: {getattr(entry, 'summary', '')}
+
+    Create a press release in Finnish about the politician’s additional comments 
+    on this news item. Keep it fairly short but newsworthy.
+    """
+    return generate_gpt_response(press_identity, press_prompt, GOODMODEL)
+
+def write_tweet(politician, entry, explanation):
+    tweet_identity = (
+        f"You are media assistant to a politician. You write tweets for them."
+        f"You create max 260 character tweets in Finnish that are structured similarly to: \n{politician['tweet_example']}"
+    )
+    tweet_prompt = f"""
+    You write this tweet because {explanation}.
+    \n\nFollowing a news article '{entry.title}' at {entry.link}, create a tweet the politician can use themself. It needs to focus on one thing and be very concrete, for example a novel policy proposal."
+    """
+    return generate_gpt_response(tweet_identity, tweet_prompt, GOODMODEL)
+
+def build_draft(entry, explanation, press_release, tweet):
+    if not press_release:
+        return None
+    title, link = entry.title, entry.link
+    subject = f"Uusi HOKSNOKKA-tiedote: {title}"
+    body = (
+        f"Otsikko: {title}\n"
+        f"Linkki: {link}\n\n"
+        f"Miksi nyt kannattaa reagoida: \n{explanation}\n\n"
+        "- - - - - 8< - - -\n\n"
+        f"Hoksnokka-pressitiedote:\n{press_release}\n"
+        "- - - - - 8< - - -\n\n"
+        f"Some-viesti:\n{tweet}\n\n"
+    )
+    return {
+        "subject": subject,
+        "body": body,
+        "explanation": explanation,
+        "link": link,
+        "title": title
+    }
+
+def select_and_send(politician, pending_drafts):
+    """
+    Final step for one politician: wait for its drafts (press release + tweet
+    futures), let GPT pick the best one and email it.
+    """
+    potential_drafts = []
+    for entry, explanation, press_future, tweet_future in pending_drafts:
+        draft = build_draft(entry, explanation, press_future.result(), tweet_future.result())
+        if draft:
+            potential_drafts.append(draft)
 
     # Decide which draft (if any) we send
     if not potential_drafts:
-        print("No potential drafts found.")
-        return newly_processed
+        print(f"No potential drafts found for {politician['file']}.")
+        return
 
     list_of_drafts_str = ""
     for i, draft in enumerate(potential_drafts, start=1):
@@ -319,7 +490,7 @@ def process_politician(
     """
 
     best_draft_response = generate_gpt_response(best_email_identity, best_email_prompt, FASTMODEL)
-    print("GPT picked press release draft number:\n", best_draft_response)
+    print(f"GPT picked press release draft number for {politician['file']}:\n", best_draft_response)
 
     if best_draft_response:
         try:
@@ -328,24 +499,112 @@ def process_politician(
             best_draft_index = 0
         if 1 <= best_draft_index <= len(potential_drafts):
             chosen_draft = potential_drafts[best_draft_index - 1]
-            send_email(chosen_draft["subject"], chosen_draft["body"], recipient_addresses)
+            send_email(chosen_draft["subject"], chosen_draft["body"], politician["recipients"])
         else:
             print("GPT decided none is worth sending (or invalid).")
     else:
         print("No valid GPT response for best draft. Skipping email send.")
 
-    return newly_processed
+def run_pipeline(politicians, entries, pairs=None):
+    """
+    Staged concurrent pipeline over (politician, article) pairs — all of them,
+    or only the given [(politician_index, entry), ...] pairs:
+      1) relevance checks on a RELEVANCE_WORKERS pool,
+      2) press release + tweet drafted in parallel on a DRAFT_WORKERS pool,
+      3) per-politician selection + email on a SELECT_WORKERS pool, started as
+         soon as all of that politician's checks are done.
+    Returns the set of links that were seen in this run.
+    """
+    newly_processed = set()
+    if not politicians:
+        return newly_processed
 
+    with ThreadPoolExecutor(max_workers=RELEVANCE_WORKERS) as check_pool, \
+         ThreadPoolExecutor(max_workers=DRAFT_WORKERS) as draft_pool, \
+         ThreadPoolExecutor(max_workers=SELECT_WORKERS) as select_pool:
+
+        if pairs is None:
+            pairs = [(pi, entry) for entry in entries for pi in range(len(politicians))]
+        # Articles screened out before any LLM call still count as processed
+        newly_processed.update(entry.link for entry in entries)
+
+        checks = {}
+        remaining = [0] * len(politicians)
+        for pi, entry in pairs:
+            checks[check_pool.submit(check_relevance, politicians[pi], entry)] = (pi, entry)
+            remaining[pi] += 1
+
+        pending_drafts = [[] for _ in politicians]
+        selections = []
+        for pi, politician in enumerate(politicians):
+            if remaining[pi] == 0:
+                selections.append(select_pool.submit(select_and_send, politician, []))
+
+        for future in as_completed(checks):
+            pi, entry = checks[future]
+            politician = politicians[pi]
+            # Mark link processed in THIS run, so it won't be shown next run
+            newly_processed.add(entry.link)
+            try:
+                explanation = future.result()
+            except Exception as e:
+                print(f"Relevance check failed for {politician['file']}: {e}")
+                explanation = None
+            if explanation:
+                pending_drafts[pi].append((
+                    entry,
+                    explanation,
+                    draft_pool.submit(write_press_release, politician, entry, explanation),
+                    draft_pool.submit(write_tweet, politician, entry, explanation),
+                ))
+            remaining[pi] -= 1
+            if remaining[pi] == 0:
+                selections.append(select_pool.submit(select_and_send, politician, pending_drafts[pi]))
+
+        for future in selections:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Draft selection failed: {e}")
 
-def main():
-    # 1) Load old processed links
-    old_processed_links = load_processed_links(PROCESSED_FILE)
-    newly_processed_links = set()
+    return newly_processed
+
+def process_politician(
+    politician_file, 
+    recipient_addresses, 
+    old_processed_links, 
+    all_entries, 
+    tweet_sample_file,    # NEW
+    press_sample_file     # NEW
+):
+    """
+    - Skips any article in 'old_processed_links' (from prior runs).
+    - Checks new articles with GPT. Possibly sends an email.
+    - Returns the set of links that were processed for this politician (in this run).
+    """
+    politician = load_politician(politician_file, recipient_addresses, tweet_sample_file, press_sample_file)
+    return run_pipeline([politician], select_new_entries(all_entries, old_processed_links))
 
-    # 2) Parse feeds once
-    all_entries = parse_all_feeds()
 
-    # 3) Iterate over CSV rows
+def main():
+    # 1) Open the dedup store (imports the legacy processed_links.txt once)
+    store = ProcessedStore()
+    if os.path.exists(PROCESSED_FILE):
+        store.mark_processed(load_processed_links(PROCESSED_FILE))
+        os.replace(PROCESSED_FILE, f"{PROCESSED_FILE}.migrated")
+    store.purge_expired()
+
+    # 2) Parse feeds once (conditional GET; validators are saved only after a full run)
+    feed_state = load_feed_state(FEED_STATE_FILE)
+    all_entries = parse_all_feeds(feed_state)
+    index_feed_entries(all_entries)
+    cursors = {url: store.get_cursor(url) for url in RSS_FEED_URLS}
+    new_entries = select_new_entries(all_entries, store, cursors)
+    # Claim atomically so an overlapping cron run does not process the same links
+    new_entries = [e for e in new_entries if store.claim(e.link, e.get("feed_url"))]
+
+    # 3) Load every subscriber from the CSV
+    politicians = []
     with open("subscribers.csv", "r", encoding="utf-8") as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
@@ -355,22 +614,29 @@ def main():
             tweet_sample_file = row.get("tweet_sample_file", "").strip()
             press_sample_file = row.get("press_sample_file", "").strip()  
 
-            print(f"\n=== PROCESSING {politician_file} FOR {recipient_addresses} ===\n")
-            processed_for_this_pol = process_politician(
+            print(f"\n=== LOADING {politician_file} FOR {recipient_addresses} ===\n")
+            politicians.append(load_politician(
                 politician_file,
                 recipient_addresses,
-                old_processed_links,  # we skip if in old links
-                all_entries,
                 tweet_sample_file,   # pass in the tweet sample
                 press_sample_file    # pass in the press release sample
-            )
-            # Union them
-            newly_processed_links |= processed_for_this_pol
+            ))
 
-    # 4. After all politicians, update the global processed links
-    all_processed = old_processed_links | newly_processed_links
-    save_processed_links(PROCESSED_FILE, all_processed)
+    # 4) Pre-screen each article once, then one staged pipeline over the surviving pairs
+    pairs = prescreen_pairs(politicians, new_entries) if PRESCREEN_ENABLED else None
+    run_pipeline(politicians, new_entries, pairs)
+
+    # 5) After all politicians, advance the per-feed cursors and save validators
+    newest = {}
+    for entry in all_entries:
+        ts = entry_timestamp(entry)
+        if ts is not None and entry.get("feed_url"):
+            newest[entry["feed_url"]] = max(ts, newest.get(entry["feed_url"], ts))
+    for feed_url, ts in newest.items():
+        store.advance_cursor(feed_url, ts)
+    save_feed_state(FEED_STATE_FILE, feed_state)
+    store.close()
     print("\n=== All done for all politicians. ===\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,229 @@
+#migrations.py
+"""
+Versioned schema migrations.
+
+Run once per deploy, out of band (Heroku release phase, see Procfile):
+
+    python -m models.migrations            # apply pending migrations
+    python -m models.migrations --status   # list applied / pending
+
+Applied versions are recorded in schema_migrations. Every migration must be
+idempotent (IF NOT EXISTS / inspector checks) so a half-applied one can simply
+be re-run. On PostgreSQL an advisory lock keeps concurrent runs apart and
+indexes on existing tables are built CONCURRENTLY so writes are not blocked.
+"""
+import sys
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+from .db_utils import (
+    engine, Base, Article, RunArticle, ChatSummary, LLMCacheEntry, RetentionArchive, NewsIngestState,
+    backfill_persona_prompts, compact_news_analysis,
+)
+from .news_index import NEWS_TS_CONFIG
+
+MIGRATIONS_LOCK_ID = 7340021  # arbitrary, shared by all migrate() callers
+
+
+def _is_postgres():
+    return engine.dialect.name == "postgresql"
+
+
+def _create_index(name: str, table: str, columns: str, using: str | None = None):
+    """CREATE INDEX IF NOT EXISTS, CONCURRENTLY on PostgreSQL (needs autocommit)."""
+    if _is_postgres():
+        method = f" USING {using}" if using else ""
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}{method} ({columns})"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _m001_baseline():
+    """Every table of db_utils (no-op for tables that already exist)."""
+    Base.metadata.create_all(engine)
+
+
+def _m002_persona_sampling_and_prompts():
+    """personas.rand_key (indexed random sampling) and personas.prompt_text (stored prompt)."""
+    existing = {c["name"] for c in inspect(engine).get_columns("personas")}
+    if "rand_key" not in existing:
+        rand_sql = "random()" if _is_postgres() else "abs(random()) / 9223372036854775807.0"
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE personas ADD COLUMN rand_key FLOAT"))
+            conn.execute(text(f"UPDATE personas SET rand_key = {rand_sql}"))
+    if "prompt_text" not in existing:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE personas ADD COLUMN prompt_text TEXT"))
+    backfill_persona_prompts()
+    _create_index("ix_personas_population_rand", "personas", "population_id, rand_key")
+
+
+def _m003_run_centric_indexes():
+    """Latest-row-per-run / per-session lookups (get_news_analysis, get_chat_by_run, get_latest_run)."""
+    _create_index("ix_news_analysis_run_created", "news_analysis", "run_id, created_at DESC")
+    _create_index("ix_chat_messages_run_created", "chat_messages", "run_id, created_at DESC")
+    _create_index("ix_runs_session_created", "runs", "session_id, created_at DESC")
+
+
+def _m004_retention_indexes():
+    """created_at lookups for the batched retention deletes (models/retention.py)."""
+    _create_index("ix_runs_created_at", "runs", "created_at")
+    _create_index("ix_user_sessions_created_at", "user_sessions", "created_at")
+
+
+def _m005_normalized_articles():
+    """articles + run_articles; move articles out of existing news_analysis snapshots."""
+    Base.metadata.create_all(engine, tables=[Article.__table__, RunArticle.__table__])
+    compact_news_analysis()
+
+
+def _m006_llm_cache():
+    """Durable LLM cache table (formerly created by models/llm_cache.py on first use)."""
+    Base.metadata.create_all(engine, tables=[LLMCacheEntry.__table__])
+
+
+def _m007_chat_summaries():
+    """chat_summaries: stored rolling summaries of run chats (context_window.run_chat_window)."""
+    Base.metadata.create_all(engine, tables=[ChatSummary.__table__])
+
+
+def _m008_retention_archive():
+    """Durable archive table for models/retention.py (replaces gzip files on the dyno's disk)."""
+    Base.metadata.create_all(engine, tables=[RetentionArchive.__table__])
+
+
+def _m009_news_index():
+    """
+    News index on articles: summary / source / published_at, the ingest claim
+    table and, on PostgreSQL, a generated tsvector over title + summary with a
+    GIN index (replaces the per-dyno SQLite FTS file).
+    """
+    existing = {c["name"] for c in inspect(engine).get_columns("articles")}
+    with engine.begin() as conn:
+        for name, sql_type in (("summary", "TEXT"), ("source", "TEXT"), ("published_at", "TIMESTAMP")):
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE articles ADD COLUMN {name} {sql_type}"))
+    _create_index("ix_articles_published_at", "articles", "published_at")
+    Base.metadata.create_all(engine, tables=[NewsIngestState.__table__])
+    if _is_postgres():
+        with engine.begin() as conn:
+            conn.execute(text(
+                "ALTER TABLE articles ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+                f" setweight(to_tsvector('{NEWS_TS_CONFIG}', coalesce(title, '')), 'A') ||"
+                f" setweight(to_tsvector('{NEWS_TS_CONFIG}', coalesce(summary, '')), 'B')) STORED"
+            ))
+        _create_index("ix_articles_search_vector", "articles", "search_vector", using="gin")
+
+
+_SQLITE_FTS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS articles_fts_ai AFTER INSERT ON articles BEGIN"
+    " INSERT INTO articles_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS articles_fts_ad AFTER DELETE ON articles BEGIN"
+    " INSERT INTO articles_fts(articles_fts, rowid, title, summary)"
+    " VALUES ('delete', old.id, old.title, old.summary); END",
+    "CREATE TRIGGER IF NOT EXISTS articles_fts_au AFTER UPDATE OF title, summary ON articles BEGIN"
+    " INSERT INTO articles_fts(articles_fts, rowid, title, summary)"
+    " VALUES ('delete', old.id, old.title, old.summary);"
+    " INSERT INTO articles_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary); END",
+)
+
+
+def _m010_news_index_sqlite_fts():
+    """
+    SQLite (local / offline runs): an FTS5 index over articles.title + summary,
+    kept in sync by triggers, so search_news does not scan with LIKE. Skipped
+    on PostgreSQL (migration 009) and on SQLite builds without FTS5.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5("
+                " title, summary, content='articles', content_rowid='id',"
+                " tokenize='unicode61 remove_diacritics 2')"
+            ))
+            for sql in _SQLITE_FTS_TRIGGERS:
+                conn.execute(text(sql))
+            conn.execute(text("INSERT INTO articles_fts(articles_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        logging.warning(f"SQLite FTS5 unavailable, news search falls back to LIKE: {e}")
+
+
+# (version, name, fn) — append only, never renumber
+MIGRATIONS = [
+    (1, "baseline", _m001_baseline),
+    (2, "persona_sampling_and_prompts", _m002_persona_sampling_and_prompts),
+    (3, "run_centric_indexes", _m003_run_centric_indexes),
+    (4, "retention_indexes", _m004_retention_indexes),
+    (5, "normalized_articles", _m005_normalized_articles),
+    (6, "llm_cache", _m006_llm_cache),
+    (7, "chat_summaries", _m007_chat_summaries),
+    (8, "retention_archive", _m008_retention_archive),
+    (9, "news_index", _m009_news_index),
+    (10, "news_index_sqlite_fts", _m010_news_index_sqlite_fts),
+]
+
+
+def _ensure_version_table():
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version INTEGER PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        ))
+
+
+def applied_versions() -> set[int]:
+    _ensure_version_table()
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending_migrations():
+    done = applied_versions()
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def migrate() -> list[int]:
+    """Apply pending migrations in order. Returns the versions applied by this call."""
+    lock_conn = None
+    if _is_postgres():
+        lock_conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        lock_conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": MIGRATIONS_LOCK_ID})
+    try:
+        applied = []
+        for version, name, fn in pending_migrations():
+            logging.info(f"Applying migration {version:03d}_{name}")
+            fn()
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                    {"v": version, "n": name},
+                )
+            applied.append(version)
+        return applied
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": MIGRATIONS_LOCK_ID})
+            lock_conn.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    if "--status" in sys.argv[1:]:
+        done = applied_versions()
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:03d}_{name}: {'applied' if version in done else 'pending'}")
+        return
+    applied = migrate()
+    print(f"Applied {len(applied)} migration(s)" + (f": {applied}" if applied else ""))
+
+
+if __name__ == "__main__":
+    main()
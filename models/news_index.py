@@ -0,0 +1,286 @@
+#news_index.py
+"""
+Shared news index for the media snapshot, stored in the articles table.
+
+    python -m models.news_index          # ingester loop (Procfile worker)
+    python -m models.news_index --once   # one pass (Heroku Scheduler / cron)
+
+The ingester feeds RSS entries (models/main.py feeds), GNews top news and the
+offline fixture into articles; the app adds its GNews search results and only
+queries the index while a snapshot is built. On PostgreSQL titles and summaries
+are searched through a generated tsvector column with a GIN index (Finnish
+stemming, prefix matching; migration 009), on SQLite through the articles_fts
+FTS5 table (prefix matching; migration 010); LIKE is only the fallback for
+SQLite builds without FTS5. Every article has a published_at timestamp for the
+recency window.
+
+Offline: NEWS_OFFLINE=1 skips external fetches and NEWS_FIXTURE_FEED points at a
+local RSS/Atom file that every ingest pass loads with its dates shifted so the
+newest item is "now" (the app runs one pass at startup when offline).
+"""
+import os
+import re
+import sys
+import time
+import logging
+import calendar
+from datetime import datetime, timedelta
+from functools import lru_cache
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from sqlalchemy import select, delete, exists, func, or_, inspect, literal_column, table, column
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .db_utils import engine, get_session, Article, RunArticle, NewsIngestState, _article_row
+
+NEWS_LANGUAGE, NEWS_COUNTRY = "fi", "FI"
+NEWS_TS_CONFIG = "finnish"  # text search configuration of articles.search_vector (migration 009)
+NEWS_INDEX_KEEP_DAYS = float(os.environ.get("NEWS_INDEX_KEEP_DAYS", 60))
+NEWS_INGEST_INTERVAL = float(os.environ.get("NEWS_INGEST_INTERVAL", "900"))  # seconds
+NEWS_OFFLINE = os.environ.get("NEWS_OFFLINE", "0") == "1"  # no external fetches; fixture feed only
+NEWS_FIXTURE_FEED = os.environ.get("NEWS_FIXTURE_FEED") or ("./fixtures/news_fixture.xml" if NEWS_OFFLINE else "")
+
+_TOKEN_RE = re.compile(r"[0-9A-Za-zÅÄÖåäöÉéÜü]+")
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _published_at(value):
+    """UTC datetime from epoch numbers, struct_time, RFC 822 or ISO strings (None if unknown)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.utcfromtimestamp(value)
+    if isinstance(value, time.struct_time):
+        return datetime.utcfromtimestamp(calendar.timegm(value))
+    s = str(value).strip()
+    try:
+        dt = parsedate_to_datetime(s)
+    except (TypeError, ValueError, IndexError):
+        try:
+            dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return datetime.utcfromtimestamp(dt.timestamp()) if dt.tzinfo else dt
+
+
+def _published_text(dt):
+    # Same format rank_articles / _parse_published_dt already understand
+    return dt.strftime("%Y-%m-%d %H:%M") if dt else ""
+
+
+def feed_entry_article(entry, source=None):
+    """feedparser entry -> article dict; publisher is the entry's source title or the link's host."""
+    link = entry.get("link") or ""
+    origin = entry.get("source")
+    publisher = (origin.get("title") if isinstance(origin, dict) else None) or urlsplit(link).netloc.removeprefix("www.")
+    return {
+        "title": entry.get("title"),
+        "summary": _TAG_RE.sub(" ", entry.get("summary") or ""),
+        "url": link or None,
+        "publisher": publisher or "",
+        "published": entry.get("published_parsed") or entry.get("updated_parsed") or entry.get("published"),
+        "source": entry.get("feed_url") or source,
+    }
+
+
+def gnews_articles(results):
+    """GNews result dicts -> article dicts."""
+    arts = []
+    for it in results or []:
+        arts.append({
+            "title": it.get("title"),
+            "publisher": (it.get("publisher") or {}).get("title",""),
+            "published": it.get("published date") or "",
+            "url": it.get("url"),
+            "summary": it.get("description") or "",
+        })
+    return arts
+
+
+def fetch_top_news(max_items: int = 50):
+    """Optional dependency. No crash if gnews is missing."""
+    try:
+        from gnews import GNews
+        g = GNews(language=NEWS_LANGUAGE, country=NEWS_COUNTRY, max_results=max_items)
+        return gnews_articles(g.get_top_news())
+    except Exception:
+        return []
+
+
+def add_articles(articles, source=None, refresh_published: bool = False) -> int:
+    """
+    Upsert article dicts (title, url, summary, publisher, published) into the
+    index. Known articles only get missing summary / published_at / source
+    filled in (refresh_published=True overwrites published_at, for fixtures).
+    Returns the number of new articles.
+    """
+    rows = {}
+    for a in articles or []:
+        title = (a.get("title") or "").strip()
+        if not title:
+            continue
+        published_at = _published_at(a.get("published"))
+        row = _article_row({**a, "title": title})
+        row.update(
+            summary=(a.get("summary") or "").strip(),
+            source=a.get("source") or source,
+            published_at=published_at,
+            published=_published_text(published_at) or (a.get("published") if isinstance(a.get("published"), str) else None),
+        )
+        rows[row["url_hash"]] = row
+    if not rows:
+        return 0
+    dialect_insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(Article)
+    t = Article.__table__
+    fill = {c: func.coalesce(t.c[c], stmt.excluded[c]) for c in ("summary", "source", "published_at", "published")}
+    if refresh_published:
+        fill.update(published_at=stmt.excluded.published_at, published=stmt.excluded.published)
+    with get_session() as s:
+        known = set(s.execute(select(Article.url_hash).where(Article.url_hash.in_(list(rows)))).scalars())
+        s.execute(stmt.on_conflict_do_update(index_elements=["url_hash"], set_=fill), list(rows.values()))
+    return len(rows) - len(known)
+
+
+def add_feed_entries(entries, source=None) -> int:
+    return add_articles([feed_entry_article(e, source) for e in entries or []], source)
+
+
+def _terms(topics):
+    terms = []
+    for topic in topics or []:
+        for token in _TOKEN_RE.findall(str(topic)):
+            if len(token) >= 2 and token.lower() not in terms:
+                terms.append(token.lower())
+    return terms
+
+
+@lru_cache(maxsize=1)
+def _has_sqlite_fts() -> bool:
+    """articles_fts exists (migration 010 ran on an SQLite build with FTS5)."""
+    return engine.dialect.name == "sqlite" and inspect(engine).has_table("articles_fts")
+
+
+def search_news(topics, days=14, limit=6):
+    """
+    Articles published in the last `days` that match any topic (title and
+    summary), best match first, newer first on ties.
+    Returns the snapshot article shape: title, publisher, published, url.
+    """
+    terms = _terms(topics)
+    if not terms:
+        return []
+    since = datetime.utcnow() - timedelta(days=days)
+    stmt = select(Article.title, Article.publisher, Article.published_at, Article.url).where(
+        Article.published_at >= since
+    )
+    if engine.dialect.name == "postgresql":
+        # Tokens are alphanumeric only, so they are safe tsquery operands
+        query = func.to_tsquery(NEWS_TS_CONFIG, " | ".join(f"{t}:*" for t in terms))
+        vector = literal_column("articles.search_vector")
+        stmt = stmt.where(vector.op("@@")(query)).order_by(
+            func.ts_rank(vector, query).desc(), Article.published_at.desc()
+        )
+    elif _has_sqlite_fts():
+        # Quoted prefix terms; tokens are alphanumeric only, so no FTS5 syntax leaks in
+        match = " OR ".join(f'"{t}"*' for t in terms)
+        fts = table("articles_fts", column("rowid"))
+        stmt = stmt.join(fts, fts.c.rowid == Article.id).where(
+            literal_column("articles_fts").op("MATCH")(match)
+        ).order_by(literal_column("bm25(articles_fts, 2.0, 1.0)"), Article.published_at.desc())
+    else:
+        stmt = stmt.where(or_(*(
+            or_(func.lower(Article.title).like(f"%{t}%"), func.lower(Article.summary).like(f"%{t}%"))
+            for t in terms
+        ))).order_by(Article.published_at.desc())
+    with get_session() as s:
+        rows = s.execute(stmt.limit(limit)).all()
+    return [
+        {"title": r.title, "publisher": r.publisher or "", "published": _published_text(r.published_at), "url": r.url}
+        for r in rows
+    ]
+
+
+def purge_news_index(keep_days=NEWS_INDEX_KEEP_DAYS) -> int:
+    """Drop old articles no snapshot links to."""
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    with get_session() as s:
+        return s.execute(delete(Article).where(
+            func.coalesce(Article.published_at, Article.first_seen_at) < cutoff,
+            ~exists().where(RunArticle.article_id == Article.id),
+        )).rowcount
+
+
+def claim_ingest(key, interval) -> bool:
+    """True if the caller should run `key` now (at most once per interval across all processes)."""
+    now = datetime.utcnow()
+    dialect_insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(NewsIngestState).values(key=key, claimed_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"claimed_at": stmt.excluded.claimed_at},
+        where=NewsIngestState.claimed_at < now - timedelta(seconds=interval),
+    )
+    with get_session() as s:
+        return s.execute(stmt).rowcount == 1
+
+
+def load_fixture(path=NEWS_FIXTURE_FEED, rebase=True) -> int:
+    """
+    Load a local RSS/Atom file into the index. With rebase=True dates are
+    shifted so the newest item is published now, keeping the fixture inside
+    the recency window forever.
+    """
+    import feedparser
+
+    if not path or not os.path.exists(path):
+        return 0
+    source = f"fixture:{os.path.basename(path)}"
+    articles = [dict(feed_entry_article(e), source=source) for e in feedparser.parse(path).entries]
+    stamps = [_published_at(a["published"]) for a in articles]
+    if rebase and any(stamps):
+        shift = datetime.utcnow() - max(s for s in stamps if s)
+        for a, ts in zip(articles, stamps):
+            a["published"] = ts + shift if ts else None
+    return add_articles(articles, refresh_published=rebase)
+
+
+_feed_state = {}  # ETag / Last-Modified per feed for this process
+
+
+def ingest_once(interval=NEWS_INGEST_INTERVAL) -> int:
+    """Fixture feed, RSS feeds and GNews top news into the index (each at most once per interval)."""
+    added = load_fixture(NEWS_FIXTURE_FEED) if NEWS_FIXTURE_FEED and claim_ingest("fixture", interval) else 0
+    if NEWS_OFFLINE or not claim_ingest("feeds", interval):
+        return added
+    from .main import parse_all_feeds  # models/main.py imports this module
+
+    added += add_feed_entries(parse_all_feeds(_feed_state))
+    added += add_articles(fetch_top_news(), source="gnews")
+    purge_news_index()
+    return added
+
+
+def run_ingester(interval=NEWS_INGEST_INTERVAL):
+    while True:
+        try:
+            logging.info(f"News index: {ingest_once(interval)} new articles")
+        except Exception:
+            logging.exception("News index: ingest failed")
+        time.sleep(max(interval, 1))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    if "--once" in sys.argv[1:]:
+        print(f"News index: {ingest_once()} new articles")
+        return
+    run_ingester()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#processed_store.py
+import os
+import time
+import sqlite3
+import hashlib
+import calendar
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+PROCESSED_DB = os.environ.get('PROCESSED_DB', "processed_links.sqlite")
+PROCESSED_TTL_DAYS = float(os.environ.get('PROCESSED_TTL_DAYS', 30))
+
+_TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+
+
+def normalize_url(url):
+    """Lowercase scheme/host, drop fragment, tracking params and trailing slash."""
+    parts = urlsplit((url or "").strip())
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(_TRACKING_PARAMS)
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(sorted(query)), ""))
+
+
+def url_hash(url):
+    return hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+
+
+def entry_timestamp(entry):
+    """published_parsed (UTC struct_time) as epoch seconds, or None."""
+    published = entry.get("published_parsed")
+    return calendar.timegm(published) if published else None
+
+
+class ProcessedStore:
+    """
+    Dedup store for processed article links, replacing processed_links.txt.
+
+    Rows are keyed by sha256 of the normalized URL and expire after ttl_days.
+    claim() is a single atomic upsert that only succeeds for new or expired
+    links, so overlapping cron runs never both process the same link. Per-feed cursors remember the
+    newest publish time seen so older entries are skipped up front.
+    """
+
+    def __init__(self, path=PROCESSED_DB, ttl_days=PROCESSED_TTL_DAYS):
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=30000")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed_links ("
+            " url_hash TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " feed_url TEXT,"
+            " processed_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_processed_links_processed_at ON processed_links (processed_at)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS feed_cursors ("
+            " feed_url TEXT PRIMARY KEY,"
+            " last_published REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def purge_expired(self):
+        cur = self.conn.execute(
+            "DELETE FROM processed_links WHERE processed_at < ?", (time.time() - self.ttl_seconds,)
+        )
+        return cur.rowcount
+
+    def is_processed(self, url):
+        row = self.conn.execute(
+            "SELECT 1 FROM processed_links WHERE url_hash = ? AND processed_at >= ?",
+            (url_hash(url), time.time() - self.ttl_seconds),
+        ).fetchone()
+        return row is not None
+
+    def __contains__(self, url):
+        return self.is_processed(url)
+
+    def claim(self, url, feed_url=None):
+        """Atomically mark url processed. True if this call claimed it, False if already there."""
+        cur = self.conn.execute(
+            "INSERT INTO processed_links (url_hash, url, feed_url, processed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(url_hash) DO UPDATE SET processed_at = excluded.processed_at, url = excluded.url "
+            "WHERE processed_links.processed_at < ?",
+            (url_hash(url), url, feed_url, time.time(), time.time() - self.ttl_seconds),
+        )
+        return cur.rowcount == 1
+
+    def mark_processed(self, urls, feed_url=None):
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT INTO processed_links (url_hash, url, feed_url, processed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url_hash) DO UPDATE SET processed_at = excluded.processed_at",
+                [(url_hash(u), u, feed_url, now) for u in urls],
+            )
+
+    def get_cursor(self, feed_url):
+        row = self.conn.execute(
+            "SELECT last_published FROM feed_cursors WHERE feed_url = ?", (feed_url,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def advance_cursor(self, feed_url, last_published):
+        """Move the feed cursor forward (never backwards)."""
+        self.conn.execute(
+            "INSERT INTO feed_cursors (feed_url, last_published, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(feed_url) DO UPDATE SET "
+            " last_published = MAX(feed_cursors.last_published, excluded.last_published),"
+            " updated_at = excluded.updated_at",
+            (feed_url, last_published, time.time()),
+        )
@@ -0,0 +1,263 @@
+#retention.py
+"""
+Retention, archival and bloat reporting for the hot tables.
+
+    python -m models.retention             # archive + delete expired rows
+    python -m models.retention --dry-run   # only count what would go
+    python -m models.retention --report    # table / index size and dead-tuple report
+
+Meant for a daily Heroku Scheduler job. Rows are deleted in small batches, each
+in its own transaction, so locks stay short and autovacuum can keep up.
+news_analysis snapshots are archived before they are deleted, as stored
+(compact; their articles stay in the articles table): with RETENTION_EXPORT_URL
+each batch is written as one gzip'd JSONL object to that directory or s3://
+prefix (a dyno's own disk does not survive a restart, so point it at mounted
+or object storage), otherwise the rows go to the retention_archive table, which
+has its own TTL.
+Runs that still have news, chat or review rows inside their own retention
+window are kept, so a longer news_analysis window is never cut short by the
+runs cascade.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, exists, func, text
+
+from .db_utils import (
+    engine, Run, UserSession, NewsAnalysis, ChatMessage, RunReview, NewsCache, Article, RunArticle,
+    RetentionArchive,
+)
+
+RETENTION_RUNS_DAYS = float(os.environ.get("RETENTION_RUNS_DAYS", "180"))
+RETENTION_NEWS_ANALYSIS_DAYS = float(os.environ.get("RETENTION_NEWS_ANALYSIS_DAYS", str(RETENTION_RUNS_DAYS)))
+RETENTION_CHAT_DAYS = float(os.environ.get("RETENTION_CHAT_DAYS", str(RETENTION_RUNS_DAYS)))
+RETENTION_REVIEWS_DAYS = float(os.environ.get("RETENTION_REVIEWS_DAYS", str(RETENTION_RUNS_DAYS)))
+RETENTION_ARCHIVE_DAYS = float(os.environ.get("RETENTION_ARCHIVE_DAYS", "365"))  # retention_archive rows
+RETENTION_SESSIONS_DAYS = float(os.environ.get("RETENTION_SESSIONS_DAYS", "90"))
+RETENTION_NEWS_CACHE_DAYS = float(os.environ.get("RETENTION_NEWS_CACHE_DAYS", "7"))
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "1000"))
+RETENTION_BATCH_PAUSE = float(os.environ.get("RETENTION_BATCH_PAUSE", "0.1"))  # seconds between batches
+# Directory (file:// or plain path) or s3://bucket/prefix for archive exports; empty = retention_archive table
+RETENTION_EXPORT_URL = os.environ.get("RETENTION_EXPORT_URL", "")
+
+
+def _cutoff(days: float) -> datetime:
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def export_rows(table_name: str, rows: list[dict], target: str = RETENTION_EXPORT_URL) -> str:
+    """
+    Write rows as one gzip'd JSONL object <table>/<date>-<first id>-<last id>.jsonl.gz
+    under target (a directory or s3://bucket/prefix). Returns its location.
+    """
+    body = gzip.compress("".join(
+        json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows
+    ).encode("utf-8"))
+    name = f"{table_name}/{datetime.utcnow():%Y%m%d}-{rows[0]['id']}-{rows[-1]['id']}.jsonl.gz"
+    if target.startswith("s3://"):
+        import boto3  # optional dependency, only needed for s3:// targets
+
+        bucket, _, prefix = target[len("s3://"):].partition("/")
+        key = f"{prefix.strip('/')}/{name}" if prefix.strip("/") else name
+        boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=body,
+                                      ContentType="application/x-ndjson", ContentEncoding="gzip")
+        return f"s3://{bucket}/{key}"
+    path = os.path.join(target.removeprefix("file://"), name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(body)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def archive_rows(conn, table_name: str, rows: list[dict]) -> int:
+    """
+    Archive rows before the caller deletes them on conn: export them when
+    RETENTION_EXPORT_URL is set (a failed export raises, so nothing is deleted),
+    otherwise copy them into retention_archive in the same transaction.
+    """
+    if not rows:
+        return 0
+    if RETENTION_EXPORT_URL:
+        logging.info(f"Archived {len(rows)} {table_name} rows to {export_rows(table_name, rows)}")
+        return len(rows)
+    conn.execute(RetentionArchive.__table__.insert(), [
+        {"table_name": table_name, "row_id": str(row["id"]),
+         "data": json.loads(json.dumps(row, ensure_ascii=False, default=str))}
+        for row in rows
+    ])
+    return len(rows)
+
+
+def purge_oldest_by_id(model, cutoff: datetime, archive: bool = False, dry_run: bool = False,
+                       batch_size: int = RETENTION_BATCH_SIZE, column: str = "created_at") -> int:
+    """
+    For append-only tables with a serial id, ids grow with `column` (created_at):
+    walk the primary key from the oldest row and stop at the first row newer
+    than cutoff. No timestamp index is needed.
+    """
+    table = model.__table__
+    deleted, after_id = 0, None
+    while True:
+        stmt = select(table).order_by(table.c.id).limit(batch_size)
+        if after_id is not None:
+            stmt = stmt.where(table.c.id > after_id)
+        with engine.connect() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(stmt)]
+        expired = [r for r in rows if r[column] < cutoff]
+        if expired:
+            after_id = expired[-1]["id"]
+            if not dry_run:
+                with engine.begin() as conn:
+                    if archive:
+                        archive_rows(conn, table.name, expired)
+                    conn.execute(delete(table).where(table.c.id.in_([r["id"] for r in expired])))
+            deleted += len(expired)
+        if len(expired) < batch_size:
+            return deleted
+        time.sleep(RETENTION_BATCH_PAUSE)
+
+
+def purge_by_timestamp(model, column, cutoff: datetime, *extra_where, dry_run: bool = False,
+                       batch_size: int = RETENTION_BATCH_SIZE) -> int:
+    """Batched DELETE ... WHERE pk IN (SELECT pk ... WHERE column < cutoff LIMIT n)."""
+    table = model.__table__
+    pk = list(table.primary_key.columns)[0]
+    where = [column < cutoff, *extra_where]
+    if dry_run:
+        with engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(table).where(*where)).scalar_one()
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            ids = conn.execute(select(pk).where(*where).limit(batch_size)).scalars().all()
+            if ids:
+                conn.execute(delete(table).where(pk.in_(ids)))
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
+        time.sleep(RETENTION_BATCH_PAUSE)
+
+
+def run_retention(dry_run: bool = False) -> dict:
+    """
+    Apply every policy, children before parents so each batch stays small
+    (deleting a run cascades to run_jobs). A run is only deleted once its
+    news_analysis, chat_messages and run_reviews rows are gone, i.e. expired
+    under their own windows. Returns {table: rows deleted (or that would be
+    deleted; dry runs do not see rows freed by the earlier policies)}.
+    """
+    result = {
+        "news_analysis": purge_oldest_by_id(
+            NewsAnalysis, _cutoff(RETENTION_NEWS_ANALYSIS_DAYS), archive=True, dry_run=dry_run),
+        "chat_messages": purge_oldest_by_id(ChatMessage, _cutoff(RETENTION_CHAT_DAYS), dry_run=dry_run),
+        "run_reviews": purge_oldest_by_id(RunReview, _cutoff(RETENTION_REVIEWS_DAYS), dry_run=dry_run),
+        "runs": purge_by_timestamp(
+            Run, Run.created_at, _cutoff(RETENTION_RUNS_DAYS),
+            ~exists().where(NewsAnalysis.run_id == Run.id),
+            ~exists().where(ChatMessage.run_id == Run.id),
+            ~exists().where(RunReview.run_id == Run.id), dry_run=dry_run),
+        # Only sessions with no runs left: deleting a session cascades to its runs
+        "user_sessions": purge_by_timestamp(
+            UserSession, UserSession.created_at, _cutoff(RETENTION_SESSIONS_DAYS),
+            ~exists().where(Run.session_id == UserSession.id), dry_run=dry_run),
+        # Articles no snapshot links to any more
+        "articles": purge_by_timestamp(
+            Article, Article.first_seen_at, _cutoff(RETENTION_NEWS_ANALYSIS_DAYS),
+            ~exists().where(RunArticle.article_id == Article.id), dry_run=dry_run),
+        "news_cache": purge_by_timestamp(
+            NewsCache, NewsCache.fetched_at, _cutoff(RETENTION_NEWS_CACHE_DAYS), dry_run=dry_run),
+        "retention_archive": purge_oldest_by_id(
+            RetentionArchive, _cutoff(RETENTION_ARCHIVE_DAYS), dry_run=dry_run, column="archived_at"),
+    }
+    return result
+
+
+_PG_BLOAT_SQL = """
+SELECT t.relname AS name,
+       t.n_live_tup AS live_rows,
+       t.n_dead_tup AS dead_rows,
+       pg_total_relation_size(t.relid) AS total_bytes,
+       pg_indexes_size(t.relid) AS index_bytes,
+       t.last_autovacuum AS last_autovacuum
+FROM pg_stat_user_tables t
+ORDER BY pg_total_relation_size(t.relid) DESC
+"""
+
+_PG_INDEX_SQL = """
+SELECT i.relname AS table_name,
+       i.indexrelname AS name,
+       i.idx_scan AS scans,
+       pg_relation_size(i.indexrelid) AS bytes
+FROM pg_stat_user_indexes i
+ORDER BY pg_relation_size(i.indexrelid) DESC
+"""
+
+
+def bloat_report() -> dict:
+    """
+    PostgreSQL: per-table live/dead tuples and sizes plus per-index scans and
+    size (dead-tuple ratio is the bloat estimate; unused large indexes show up
+    with 0 scans). SQLite: page and freelist counts of the whole file.
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            tables = [dict(r._mapping) for r in conn.execute(text(_PG_BLOAT_SQL))]
+            for t in tables:
+                total = (t["live_rows"] or 0) + (t["dead_rows"] or 0)
+                t["dead_ratio"] = round((t["dead_rows"] or 0) / total, 3) if total else 0.0
+            indexes = [dict(r._mapping) for r in conn.execute(text(_PG_INDEX_SQL))]
+            return {"tables": tables, "indexes": indexes}
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+        pages = conn.execute(text("PRAGMA page_count")).scalar()
+        free = conn.execute(text("PRAGMA freelist_count")).scalar()
+        return {"database": {
+            "total_bytes": page_size * pages,
+            "free_bytes": page_size * free,
+            "free_ratio": round(free / pages, 3) if pages else 0.0,
+        }}
+
+
+def _format_bytes(n) -> str:
+    n = float(n or 0)
+    for unit in ("B", "kB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def print_bloat_report(report: dict):
+    if "database" in report:
+        db = report["database"]
+        print(f"database: {_format_bytes(db['total_bytes'])}, free pages {_format_bytes(db['free_bytes'])} "
+              f"({db['free_ratio']:.1%}); run VACUUM if this stays high")
+        return
+    print(f"{'table':<24}{'live':>12}{'dead':>10}{'dead %':>8}{'total':>12}{'indexes':>12}")
+    for t in report["tables"]:
+        print(f"{t['name']:<24}{t['live_rows']:>12}{t['dead_rows']:>10}{t['dead_ratio']:>8.1%}"
+              f"{_format_bytes(t['total_bytes']):>12}{_format_bytes(t['index_bytes']):>12}")
+    print(f"\n{'index':<40}{'table':<24}{'scans':>10}{'size':>12}")
+    for i in report["indexes"]:
+        print(f"{i['name']:<40}{i['table_name']:<24}{i['scans']:>10}{_format_bytes(i['bytes']):>12}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    args = sys.argv[1:]
+    if "--report" in args:
+        print_bloat_report(bloat_report())
+        return
+    dry_run = "--dry-run" in args
+    result = run_retention(dry_run=dry_run)
+    verb = "would delete" if dry_run else "deleted"
+    for table, count in result.items():
+        print(f"{table}: {verb} {count}")
+
+
+if __name__ == "__main__":
+    main()
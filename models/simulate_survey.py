@@ -2,13 +2,14 @@ import json
 import numpy as np
 from collections import Counter
 
-def simulate_responses_from_logprobs(completion_json, num_simulations=1000):
+def simulate_responses_from_logprobs(completion_json, num_simulations=1000, rng=None):
     """
     Simulate survey responses based on the log probabilities from GPT's completion.
     
     Args:
         completion_json (str): JSON dump of GPT's completion including logprobs.
         num_simulations (int): Number of simulated respondents.
+        rng (np.random.Generator | int | None): Generator or seed for reproducible sampling.
         
     Returns:
         dict: Count of responses for each rating (0-9).
@@ -37,12 +38,153 @@ def simulate_responses_from_logprobs(completion_json, num_simulations=1000):
     probabilities /= probabilities.sum()  # Ensure they sum to 1
 
     # Simulate responses
-    simulated_responses = np.random.choice(tokens, size=num_simulations, p=probabilities)
+    rng = np.random.default_rng(rng)
+    picks = rng.choice(len(tokens), size=num_simulations, p=probabilities)
     
     # Count the occurrences of each rating
-    response_counts = Counter(simulated_responses)
+    response_counts = Counter(tokens[i] for i in picks)
     return dict(response_counts)
 
+
+# ============ Vectorized population engine ============
+# Ratings use the 1..10 scale produced by feedback.normalize_logprobs.
+SCORES = np.arange(1, 11)
+PROMOTER_MIN = 9   # same thresholds as feedback.calculate_nps
+DETRACTOR_MAX = 6
+
+
+def distributions_to_matrix(participant_distributions):
+    """
+    Stack per-persona rating distributions ({score: prob}, keys int or str)
+    into one (n_personas x 10) float array; rows are renormalized, empty rows stay zero.
+    """
+    P = np.zeros((len(participant_distributions), len(SCORES)), dtype=np.float64)
+    for i, dist in enumerate(participant_distributions):
+        for score, prob in (dist or {}).items():
+            k = int(score) - 1
+            if 0 <= k < len(SCORES):
+                P[i, k] = prob
+    totals = P.sum(axis=1, keepdims=True)
+    np.divide(P, totals, out=P, where=totals > 0)
+    return P
+
+
+def aggregate_matrix(P):
+    """Vectorized feedback.aggregate_distributions: column sums normalized to 1."""
+    total = P.sum()
+    return P.sum(axis=0) / total if total > 0 else np.zeros(len(SCORES))
+
+
+def nps_from_matrix(P):
+    """Expected NPS of the population: 100 * (mean P(promoter) - mean P(detractor))."""
+    valid = P.sum(axis=1) > 0
+    if not valid.any():
+        return 0.0
+    pro = P[valid][:, SCORES >= PROMOTER_MIN].sum(axis=1)
+    det = P[valid][:, SCORES <= DETRACTOR_MAX].sum(axis=1)
+    return float(100.0 * (pro.mean() - det.mean()))
+
+
+def sample_ratings(P, num_responses, rng=None):
+    """
+    Draw num_responses simulated answers per persona in one pass
+    (inverse-CDF sampling). Returns an int array (num_responses x n_personas) of 1..10.
+    """
+    rng = np.random.default_rng(rng)
+    cdf = np.cumsum(P, axis=1)
+    cdf[:, -1] = 1.0  # guard against rounding
+    u = rng.random((num_responses, P.shape[0]))
+    idx = (u[:, :, None] > cdf[None, :, :]).sum(axis=2)
+    return SCORES[np.minimum(idx, len(SCORES) - 1)]
+
+
+def bootstrap_nps(P, n_boot=5000, ci=0.95, rng=None, chunk=1000):
+    """
+    Bootstrap NPS confidence interval. Each replicate resamples personas with
+    replacement and draws one answer per resampled persona, so both persona
+    and response variance are covered. Replicates run as batched array ops
+    (in chunks of `chunk` to bound memory).
+
+    Returns {"nps", "ci_low", "ci_high", "n", "n_boot"}.
+    """
+    rng = np.random.default_rng(rng)
+    P = P[P.sum(axis=1) > 0]
+    n = P.shape[0]
+    if n == 0:
+        return {"nps": 0.0, "ci_low": 0.0, "ci_high": 0.0, "n": 0, "n_boot": 0}
+
+    # Only the promoter / detractor mass matters for NPS
+    p_pro = P[:, SCORES >= PROMOTER_MIN].sum(axis=1)
+    p_det = P[:, SCORES <= DETRACTOR_MAX].sum(axis=1)
+
+    stats = np.empty(n_boot, dtype=np.float64)
+    for start in range(0, n_boot, chunk):
+        b = min(chunk, n_boot - start)
+        idx = rng.integers(0, n, size=(b, n))
+        u = rng.random((b, n))
+        promoters = (u < p_pro[idx]).sum(axis=1)
+        detractors = (u >= 1.0 - p_det[idx]).sum(axis=1)
+        stats[start:start + b] = 100.0 * (promoters - detractors) / n
+
+    alpha = (1.0 - ci) / 2.0
+    low, high = np.quantile(stats, [alpha, 1.0 - alpha])
+    return {
+        "nps": nps_from_matrix(P),
+        "ci_low": float(low),
+        "ci_high": float(high),
+        "n": int(n),
+        "n_boot": int(n_boot),
+    }
+
+
+def _age_band(age):
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    for low, high in ((0, 24), (25, 34), (35, 44), (45, 54), (55, 64)):
+        if low <= age <= high:
+            return f"{low}-{high}"
+    return "65+"
+
+
+def _mbti(value):
+    value = (value or "").strip()
+    return value[:4].upper() if value else "unknown"
+
+
+SEGMENTERS = {
+    "gender": lambda p: (p.get("gender") or "unknown").lower(),
+    "age": lambda p: _age_band(p.get("age")),
+    "mbti": lambda p: _mbti(p.get("mbti_type")),
+}
+
+
+def nps_report(personas, participant_distributions, segments=("gender", "age", "mbti"),
+               n_boot=5000, ci=0.95, seed=None):
+    """
+    Population NPS with bootstrap CI plus per-segment breakdowns computed with
+    boolean masks over the same (n_personas x 10) matrix.
+
+    personas and participant_distributions are parallel lists (persona dicts
+    and their normalized rating distributions).
+    """
+    rng = np.random.default_rng(seed)
+    P = distributions_to_matrix(participant_distributions)
+    aggregate = aggregate_matrix(P)
+    report = {
+        "overall": bootstrap_nps(P, n_boot=n_boot, ci=ci, rng=rng),
+        "aggregate_distribution": {int(s): float(p) for s, p in zip(SCORES, aggregate)},
+        "segments": {},
+    }
+    for name in segments:
+        labels = np.array([SEGMENTERS[name](p) for p in personas])
+        report["segments"][name] = {
+            str(value): bootstrap_nps(P[labels == value], n_boot=n_boot, ci=ci, rng=rng)
+            for value in np.unique(labels)
+        }
+    return report
+
 # Example Usage
 if __name__ == "__main__":
     # Simulated completion JSON (replace with real GPT response JSON)
@@ -1,26 +1,236 @@
--- populations table
+-- Generated from the models in models/db_utils.py (PostgreSQL).
+-- Reference only: apply changes with `python -m models.migrations`.
+
+-- articles
+CREATE TABLE articles (
+	id BIGSERIAL NOT NULL,
+	url_hash VARCHAR(64) NOT NULL,
+	url TEXT,
+	title TEXT,
+	publisher TEXT,
+	published TEXT,
+	first_seen_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	summary TEXT,
+	source TEXT,
+	published_at TIMESTAMP WITHOUT TIME ZONE,
+	PRIMARY KEY (id),
+	UNIQUE (url_hash)
+);
+CREATE INDEX ix_articles_published_at ON articles (published_at);
+
+-- discussions
+CREATE TABLE discussions (
+	id BIGSERIAL NOT NULL,
+	population TEXT NOT NULL,
+	discussion_data JSONB NOT NULL,
+	PRIMARY KEY (id)
+);
+
+-- llm_cache
+CREATE TABLE llm_cache (
+	key VARCHAR(64) NOT NULL,
+	value TEXT NOT NULL,
+	created_at FLOAT NOT NULL,
+	expires_at FLOAT NOT NULL,
+	PRIMARY KEY (key)
+);
+CREATE INDEX ix_llm_cache_created_at ON llm_cache (created_at);
+CREATE INDEX ix_llm_cache_expires_at ON llm_cache (expires_at);
+
+-- news_cache
+CREATE TABLE news_cache (
+	id BIGSERIAL NOT NULL,
+	query TEXT NOT NULL,
+	language VARCHAR(8) NOT NULL,
+	country VARCHAR(8) NOT NULL,
+	max_results INTEGER NOT NULL,
+	articles JSONB NOT NULL,
+	fetched_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+	PRIMARY KEY (id),
+	CONSTRAINT uq_news_cache_key UNIQUE (query, language, country)
+);
+
+-- news_ingest_state
+CREATE TABLE news_ingest_state (
+	key TEXT NOT NULL,
+	claimed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+	PRIMARY KEY (key)
+);
+
+-- nps_results
+CREATE TABLE nps_results (
+	id BIGSERIAL NOT NULL,
+	population TEXT NOT NULL,
+	nps_data JSONB NOT NULL,
+	PRIMARY KEY (id)
+);
+
+-- populations
 CREATE TABLE populations (
-    id SERIAL PRIMARY KEY,
-    name TEXT NOT NULL,
-    location TEXT,
-    created_at TIMESTAMP DEFAULT now()
+	id SERIAL NOT NULL,
+	name TEXT NOT NULL,
+	location TEXT,
+	created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	PRIMARY KEY (id)
 );
+CREATE UNIQUE INDEX ix_populations_name ON populations (name);
 
--- personas table
+-- retention_archive
+CREATE TABLE retention_archive (
+	id BIGSERIAL NOT NULL,
+	table_name TEXT NOT NULL,
+	row_id TEXT NOT NULL,
+	data JSONB NOT NULL,
+	archived_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_retention_archive_table_row ON retention_archive (table_name, row_id);
+
+-- user_sessions
+CREATE TABLE user_sessions (
+	id VARCHAR NOT NULL,
+	lang TEXT,
+	created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_user_sessions_created_at ON user_sessions (created_at);
+
+-- personas
 CREATE TABLE personas (
-    id SERIAL PRIMARY KEY,
-    population_id INT REFERENCES populations(id) ON DELETE CASCADE,
-    name TEXT,
-    age INT,
-    gender TEXT,
-    occupation TEXT,
-    education TEXT,
-    income_level TEXT,
-    financial_security TEXT,
-    main_concern TEXT,
-    source_of_joy TEXT,
-    social_ties TEXT,
-    values_and_beliefs TEXT,
-    perspective_on_change TEXT,
-    daily_routine TEXT
-);
\ No newline at end of file
+	id BIGSERIAL NOT NULL,
+	population_id INTEGER,
+	name TEXT NOT NULL,
+	age INTEGER NOT NULL,
+	gender TEXT NOT NULL,
+	orientation TEXT NOT NULL,
+	location TEXT NOT NULL,
+	mbti_type TEXT NOT NULL,
+	occupation TEXT,
+	education TEXT,
+	income_level TEXT,
+	financial_security TEXT,
+	main_concern TEXT,
+	source_of_joy TEXT,
+	social_ties TEXT,
+	values_and_beliefs TEXT,
+	perspective_on_change TEXT,
+	daily_routine TEXT,
+	prompt_text TEXT,
+	rand_key FLOAT NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(population_id) REFERENCES populations (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_personas_population_id ON personas (population_id);
+CREATE INDEX ix_personas_population_rand ON personas (population_id, rand_key);
+
+-- runs
+CREATE TABLE runs (
+	id VARCHAR NOT NULL,
+	session_id VARCHAR NOT NULL,
+	population_id INTEGER,
+	content_text TEXT,
+	created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	content_title TEXT,
+	PRIMARY KEY (id),
+	FOREIGN KEY(session_id) REFERENCES user_sessions (id) ON DELETE CASCADE,
+	FOREIGN KEY(population_id) REFERENCES populations (id) ON DELETE SET NULL
+);
+CREATE INDEX ix_runs_created_at ON runs (created_at);
+CREATE INDEX ix_runs_session_created ON runs (session_id, created_at DESC);
+
+-- chat_messages
+CREATE TABLE chat_messages (
+	id BIGSERIAL NOT NULL,
+	run_id VARCHAR NOT NULL,
+	persona_id BIGINT,
+	author TEXT NOT NULL,
+	text TEXT NOT NULL,
+	score INTEGER,
+	created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(run_id) REFERENCES runs (id) ON DELETE CASCADE,
+	FOREIGN KEY(persona_id) REFERENCES personas (id) ON DELETE SET NULL
+);
+CREATE INDEX ix_chat_messages_run_created ON chat_messages (run_id, created_at DESC);
+
+-- chat_summaries
+CREATE TABLE chat_summaries (
+	id BIGSERIAL NOT NULL,
+	run_id VARCHAR NOT NULL,
+	through_message_id BIGINT NOT NULL,
+	summary TEXT NOT NULL,
+	tokens INTEGER,
+	created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	PRIMARY KEY (id),
+	CONSTRAINT uq_chat_summaries_run_through UNIQUE (run_id, through_message_id),
+	FOREIGN KEY(run_id) REFERENCES runs (id) ON DELETE CASCADE
+);
+
+-- news_analysis
+CREATE TABLE news_analysis (
+	id BIGSERIAL NOT NULL,
+	run_id VARCHAR NOT NULL,
+	result_json JSONB NOT NULL,
+	created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(run_id) REFERENCES runs (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_news_analysis_run_created ON news_analysis (run_id, created_at DESC);
+
+-- run_jobs
+CREATE TABLE run_jobs (
+	run_id VARCHAR NOT NULL,
+	status TEXT NOT NULL,
+	stages JSONB NOT NULL,
+	error TEXT,
+	created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	PRIMARY KEY (run_id),
+	FOREIGN KEY(run_id) REFERENCES runs (id) ON DELETE CASCADE
+);
+
+-- run_reviews
+CREATE TABLE run_reviews (
+	id BIGSERIAL NOT NULL,
+	run_id VARCHAR NOT NULL,
+	dt_filename TEXT NOT NULL,
+	dt_hash VARCHAR(64) NOT NULL,
+	model TEXT NOT NULL,
+	score INTEGER NOT NULL,
+	decision TEXT NOT NULL,
+	confidence FLOAT NOT NULL,
+	reason TEXT,
+	created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT now() NOT NULL,
+	PRIMARY KEY (id),
+	CONSTRAINT uq_run_reviews_key UNIQUE (run_id, dt_filename, dt_hash, model),
+	FOREIGN KEY(run_id) REFERENCES runs (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_run_reviews_run_id ON run_reviews (run_id);
+
+-- run_articles
+CREATE TABLE run_articles (
+	news_analysis_id BIGINT NOT NULL,
+	rank INTEGER NOT NULL,
+	run_id VARCHAR NOT NULL,
+	article_id BIGINT NOT NULL,
+	PRIMARY KEY (news_analysis_id, rank),
+	FOREIGN KEY(news_analysis_id) REFERENCES news_analysis (id) ON DELETE CASCADE,
+	FOREIGN KEY(run_id) REFERENCES runs (id) ON DELETE CASCADE,
+	FOREIGN KEY(article_id) REFERENCES articles (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_run_articles_article_id ON run_articles (article_id);
+CREATE INDEX ix_run_articles_run_id ON run_articles (run_id);
+
+-- schema_migrations (managed by models/migrations.py)
+CREATE TABLE schema_migrations (
+	version INTEGER NOT NULL,
+	name TEXT NOT NULL,
+	applied_at TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP NOT NULL,
+	PRIMARY KEY (version)
+);
+
+-- articles.search_vector (added by migration 009, not declared on the model)
+ALTER TABLE articles ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+	setweight(to_tsvector('finnish', coalesce(title, '')), 'A') ||
+	setweight(to_tsvector('finnish', coalesce(summary, '')), 'B')) STORED;
+CREATE INDEX ix_articles_search_vector ON articles USING gin (search_vector);